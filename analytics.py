@@ -0,0 +1,137 @@
+"""
+Columnar analytics over the order history (optional, requires NumPy).
+
+The order lines are exported once into NumPy arrays and the revenue and
+demand statistics are computed with vectorized group-bys. Sums use
+np.bincount, which accumulates in input order, so the results are
+identical (bit for bit) to the pure-Python loops of StockManager.
+
+    columns = OrderLineColumns.from_manager(manager)
+    columns.revenue_by_product()
+    columns.revenue_over_time("M")
+"""
+import numpy as np
+from models import OrderStatus, PaymentStatus
+
+_ORDER_STATUSES = list(OrderStatus)
+_PAYMENT_STATUSES = list(PaymentStatus)
+_INACTIVE = [_ORDER_STATUSES.index(OrderStatus.CANCELLED), _ORDER_STATUSES.index(OrderStatus.ARCHIVED)]
+_PAID = _PAYMENT_STATUSES.index(PaymentStatus.PAID)
+
+# date.toordinal() of 1970-01-01, to turn ordinals into datetime64[D]
+_EPOCH_ORDINAL = 719163
+
+
+class OrderLineColumns:
+    def __init__(self, orders, label=str):
+        """
+        orders: iterable of Order; label: code_prod -> product name used in the results.
+        """
+        self.label = label
+        codes, quantities, prices, line_order = [], [], [], []
+        status, payment, paid_day = [], [], []
+        for i, o in enumerate(orders):
+            status.append(_ORDER_STATUSES.index(o.status))
+            payment.append(_PAYMENT_STATUSES.index(o.payment_status))
+            paid_day.append(o.paid_at.toordinal() - _EPOCH_ORDINAL if o.paid_at else -1)
+            for line in o.lines:
+                codes.append(line.code_prod)
+                quantities.append(line.quantity)
+                prices.append(line.price_at_order_time)
+                line_order.append(i)
+
+        # One row per order line
+        self.code_prod = np.array(codes, dtype=np.int64)
+        self.quantity = np.array(quantities)
+        self.price = np.array(prices, dtype=np.float64)
+        self.total = self.quantity * self.price
+        self.order_index = np.array(line_order, dtype=np.int64)
+        # One row per order
+        self.order_status = np.array(status, dtype=np.int8)
+        self.payment_status = np.array(payment, dtype=np.int8)
+        self.paid_day = np.array(paid_day, dtype=np.int64) # days since 1970-01-01, -1 if never paid
+        self.order_total = np.bincount(self.order_index, weights=self.total, minlength=len(status))
+
+    @classmethod
+    def from_manager(cls, manager):
+        def label(code):
+            prod = manager.get_product(code)
+            return prod.nom_prod if prod else f"Unknown ({code})"
+        return cls(manager.get_all_orders_history(), label)
+
+    # --- Line filters ---
+    def _active_lines(self):
+        return ~np.isin(self.order_status[self.order_index], _INACTIVE)
+
+    def _paid_lines(self):
+        return self.payment_status[self.order_index] == _PAID
+
+    # --- Group-by ---
+    def _group_by_product(self, mask, values):
+        """
+        Sums values per product over the masked lines. Returns (codes, sums)
+        with products in order of first appearance, like the dict loops.
+        """
+        codes = self.code_prod[mask]
+        if not len(codes):
+            return codes, np.array([])
+        if codes.min() >= 0 and codes.max() <= 4 * len(codes) + 1024:
+            # Dense product codes: bin directly on the code, no sort needed
+            sums = np.bincount(codes, weights=values[mask])
+            first = np.full(len(sums), len(codes))
+            np.minimum.at(first, codes, np.arange(len(codes)))
+            unique = np.flatnonzero(first < len(codes))
+            first, sums = first[unique], sums[unique]
+        else:
+            unique, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+            sums = np.bincount(inverse, weights=values[mask], minlength=len(unique))
+        appearance = np.argsort(first, kind='stable')
+        return unique[appearance], sums[appearance]
+
+    def _ranked(self, codes, sums, k=None, as_int=False):
+        if k is not None and k < len(sums):
+            # Top-k without sorting everything: argpartition picks an arbitrary
+            # member of a tie at the k-th value, so keep all of them and let the
+            # stable sort break ties by first appearance
+            kth = -np.partition(-sums, k - 1)[k - 1]
+            candidates = np.flatnonzero(sums >= kth)
+        else:
+            candidates = np.arange(len(sums))
+        ordered = candidates[np.argsort(-sums[candidates], kind='stable')][:k]
+        values = sums[ordered]
+        if as_int:
+            values = values.astype(np.int64)
+        return [(self.label(code), value) for code, value in zip(codes[ordered].tolist(), values.tolist())]
+
+    def revenue_by_product(self, k=None):
+        """Same as StockManager.get_revenue_by_product (paid orders), optionally top-k."""
+        codes, sums = self._group_by_product(self._paid_lines(), self.total)
+        return self._ranked(codes, sums, k)
+
+    def most_ordered_products(self, k=None):
+        """Same as StockManager.get_most_ordered_products (orders not cancelled/archived)."""
+        codes, sums = self._group_by_product(self._active_lines(), self.quantity)
+        return self._ranked(codes, sums, k, as_int=np.issubdtype(self.quantity.dtype, np.integer))
+
+    # --- Time rollups ---
+    def revenue_over_time(self, freq="D"):
+        """
+        Paid revenue per day ("D"), week starting on Monday ("W") or month ("M").
+        freq="D" gives the same result as StockManager.get_revenue_over_time.
+        """
+        mask = (self.payment_status == _PAID) & (self.paid_day >= 0)
+        days = self.paid_day[mask]
+        if not len(days):
+            return []
+        if freq == "D":
+            buckets = days.astype('datetime64[D]')
+        elif freq == "W":
+            # 1970-01-01 was a Thursday: shift back to the Monday of each week
+            buckets = (days - (days + 3) % 7).astype('datetime64[D]')
+        elif freq == "M":
+            buckets = days.astype('datetime64[D]').astype('datetime64[M]')
+        else:
+            raise ValueError(f"Unknown frequency: {freq}")
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        sums = np.bincount(inverse, weights=self.order_total[mask], minlength=len(unique))
+        return list(zip(np.datetime_as_string(unique).tolist(), sums.tolist()))
@@ -0,0 +1,336 @@
+"""
+Micro-benchmarks for the StockManager hot paths.
+Run with: python benchmark.py
+"""
+import datetime
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from manager import StockManager
+from models import Product, Order, OrderLine, OrderStatus, PaymentStatus, DeliveryStatus, ProductStatus
+from storage import write_snapshot, JsonStorage, BinaryStorage
+from sqlite_storage import SqliteStorage
+
+
+def build_manager(n_products, n_orders, lines_per_order=3):
+    """Creates a StockManager on empty temp files and fills it in memory."""
+    tmp_dir = tempfile.mkdtemp(prefix="stock_bench_")
+    manager = StockManager(os.path.join(tmp_dir, "products.json"), os.path.join(tmp_dir, "orders.json"))
+
+    manager.products = [
+        Product(code, f"Produit {code}", "bench", 100, 9.99)
+        for code in range(1, n_products + 1)
+    ]
+    manager.orders = []
+    for code in range(1, n_orders + 1):
+        lines = [
+            OrderLine(random.randint(1, n_products), 1, 9.99)
+            for _ in range(lines_per_order)
+        ]
+        manager.orders.append(Order(code, lines=lines))
+    manager._rebuild_indexes()
+    return manager
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_lookups(sizes=(1_000, 10_000, 100_000), lookups=10_000):
+    """get_product / get_order cost should stay flat as the collections grow."""
+    print("--- Lookups (get_product / get_order) ---")
+    print(f"{'size':>10} {'get_product':>14} {'get_order':>14}")
+    for size in sizes:
+        manager = build_manager(size, size, lines_per_order=1)
+        codes = [random.randint(1, size) for _ in range(lookups)]
+
+        def lookup_products():
+            for code in codes:
+                manager.get_product(code)
+
+        def lookup_orders():
+            for code in codes:
+                manager.get_order(code)
+
+        per_product = timed(lookup_products, 3) / lookups
+        per_order = timed(lookup_orders, 3) / lookups
+        print(f"{size:>10} {per_product * 1e9:>11.0f} ns {per_order * 1e9:>11.0f} ns")
+
+
+def bench_product_listing(n_products=200_000, calls=20):
+    """get_all_products_sorted: filter + sort on every call vs the maintained view."""
+    print("--- Product listing ---")
+    manager = build_manager(n_products, 0)
+    random.shuffle(manager.products)
+    manager._rebuild_indexes()
+
+    def legacy():
+        return sorted([p for p in manager.products if p.status == ProductStatus.ACTIVE], key=lambda p: p.nom_prod.lower())
+
+    assert legacy() == manager.get_all_products_sorted()
+    print(f"{n_products} products: sort {timed(legacy, calls) * 1e3:.1f} ms, "
+          f"view {timed(manager.get_all_products_sorted, calls) * 1e3:.2f} ms, "
+          f"prefix page {timed(lambda: manager.search_products('Produit 123', limit=20), calls) * 1e6:.0f} us")
+
+
+def bench_snapshot_write(n_orders=100_000):
+    """Atomic compact snapshot vs the former in-place indent=4 dump."""
+    print("--- Orders snapshot write ---")
+    manager = build_manager(1_000, n_orders)
+    path = os.path.join(os.path.dirname(manager.orders_file), "orders_bench.json")
+
+    def legacy_write():
+        with open(path, 'w') as f:
+            json.dump([o.to_dict() for o in manager.orders], f, indent=4)
+
+    def atomic_write():
+        write_snapshot(path, (o.to_dict() for o in manager.orders), backups=1)
+
+    print(f"{n_orders} orders: indent=4 {timed(legacy_write, 3):.3f}s, atomic compact {timed(atomic_write, 3):.3f}s")
+
+
+def bench_storage(n_orders=200_000):
+    """Full snapshot save/load: JSON backend vs binary backend."""
+    print("--- Storage backends (save / load / size) ---")
+    manager = build_manager(1_000, n_orders)
+    tmp_dir = os.path.dirname(manager.orders_file)
+    backends = {
+        "json": JsonStorage(os.path.join(tmp_dir, "p.json"), os.path.join(tmp_dir, "o.json"), backups=0),
+        "binary": BinaryStorage(os.path.join(tmp_dir, "stock.bin"), backups=0),
+        "sqlite": SqliteStorage(os.path.join(tmp_dir, "stock.db")),
+    }
+    for name, backend in backends.items():
+        save = timed(lambda: backend.save(manager.products, manager.orders), 1)
+        load = timed(backend.load, 1)
+        if name == "sqlite":
+            # WAL mode: move the rows from stock.db-wal into stock.db before measuring it
+            backend.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        paths = [backend.products_file, backend.orders_file] if name == "json" else [backend.path]
+        size = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"{name:>8}: save {save:.3f}s, load {load:.3f}s, {size:.1f} MB ({n_orders} orders)")
+
+
+def bench_mutation_latency(n_products=100_000, updates=2_000):
+    """Cost of one persisted quantity edit: journal append vs SQLite transaction."""
+    print("--- Persisted update_product latency ---")
+    for name in ("journal", "sqlite"):
+        tmp_dir = tempfile.mkdtemp(prefix="stock_bench_")
+        storage = SqliteStorage(os.path.join(tmp_dir, "stock.db")) if name == "sqlite" else None
+        manager = StockManager(os.path.join(tmp_dir, "products.json"), os.path.join(tmp_dir, "orders.json"),
+                               compact_every=10 ** 9, storage=storage)
+        manager.add_products((f"Produit {i}", "bench", 100, 9.99) for i in range(n_products))
+        codes = [random.randint(1, n_products) for _ in range(updates)]
+
+        def update_all():
+            for code in codes:
+                manager.update_product(code, quantite=random.randint(0, 500))
+
+        print(f"{name:>8}: {timed(update_all, 1) / updates * 1e6:.0f} us per update ({n_products} products)")
+        manager.close()
+
+
+class _DictOrderLine:
+    """OrderLine as it was before __slots__, kept as the memory baseline."""
+    def __init__(self, code_prod, quantity, price_at_order_time):
+        self.code_prod = code_prod
+        self.quantity = quantity
+        self.price_at_order_time = price_at_order_time
+
+
+class _DictOrder:
+    """Order as it was before __slots__ (plain list of lines, no cached total), the memory baseline."""
+    def __init__(self, code_cmd, lines=None, status=OrderStatus.DRAFT):
+        self.code_cmd = code_cmd
+        self.lines = lines if lines else []
+        self.status = status
+        self.payment_status = PaymentStatus.UNPAID
+        self.delivery_status = DeliveryStatus.NOT_SHIPPED
+        self.created_at = datetime.datetime.now()
+        self.updated_at = datetime.datetime.now()
+        self.paid_at = None
+        self.delivered_at = None
+        self._paid_amount = 0.0
+
+
+def bench_memory(n_orders=100_000, lines_per_order=5):
+    """Bytes per order line held in memory, the former dict-backed models vs the current slotted ones."""
+    print("--- Memory per order line ---")
+    for name, order_cls, line_cls in (("dict", _DictOrder, _DictOrderLine), ("slots", Order, OrderLine)):
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        orders = [
+            order_cls(code, [line_cls(i, 1, float(code % 100)) for i in range(lines_per_order)])
+            for code in range(n_orders)
+        ]
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        n_lines = n_orders * lines_per_order
+        print(f"{name:>8}: {used / n_lines:.0f} bytes per line (orders included), {len(orders)} orders")
+        del orders
+    # Slotted lines also hold an _order back-reference (cached order total) and
+    # orders a LineView and the cached total: included in the figures above
+    print(f"(OrderLine slots: {', '.join(OrderLine.__slots__)})")
+
+
+def _python_revenue_by_product(orders, label):
+    # Reference: the former dict-accumulation loop of get_revenue_by_product
+    revenue_map = {}
+    for order in orders:
+        if order.payment_status == PaymentStatus.PAID:
+            for line in order.lines:
+                name = label(line.code_prod)
+                revenue_map[name] = revenue_map.get(name, 0) + line.total
+    return sorted(revenue_map.items(), key=lambda x: x[1], reverse=True)
+
+
+def _python_most_ordered(orders, label):
+    stats = {}
+    for order in orders:
+        if order.status == OrderStatus.CANCELLED or order.status == OrderStatus.ARCHIVED:
+            continue
+        for line in order.lines:
+            name = label(line.code_prod)
+            stats[name] = stats.get(name, 0) + line.quantity
+    return sorted(stats.items(), key=lambda item: item[1], reverse=True)
+
+
+def _python_revenue_over_time(orders):
+    daily_revenue = {}
+    for order in orders:
+        if order.payment_status == PaymentStatus.PAID and order.paid_at:
+            date_str = order.paid_at.strftime("%Y-%m-%d")
+            daily_revenue[date_str] = daily_revenue.get(date_str, 0) + order.total_amount
+    return sorted(daily_revenue.items(), key=lambda x: x[0])
+
+
+def bench_revenue_ranges(n_orders=300_000, queries=1_000):
+    """Revenue between two dates: scan of the paid orders vs the revenue index."""
+    print("--- Revenue range queries ---")
+    manager = build_manager(1_000, n_orders, lines_per_order=1)
+    start_day = datetime.datetime(2020, 1, 1)
+    for order in manager.orders:
+        order.payment_status = PaymentStatus.PAID
+        order.paid_at = start_day + datetime.timedelta(minutes=random.randint(0, 5 * 365 * 24 * 60))
+    manager._rebuild_indexes()
+    ranges = []
+    for _ in range(queries):
+        a, b = sorted(random.sample(range(5 * 365), 2))
+        ranges.append(((start_day + datetime.timedelta(days=a)).date(), (start_day + datetime.timedelta(days=b)).date()))
+
+    def scan():
+        for start, end in ranges[:10]:
+            sum(o.total_amount for o in manager.orders
+                if o.payment_status == PaymentStatus.PAID and start <= o.paid_at.date() <= end)
+
+    def indexed():
+        for start, end in ranges:
+            manager.get_revenue_between(start, end)
+
+    per_scan = timed(scan, 1) / 10
+    per_query = timed(indexed, 3) / queries
+    per_rollup = timed(lambda: manager.get_revenue_over_time("month"), 3)
+    print(f"{n_orders} paid orders: scan {per_scan * 1e3:.1f} ms, index {per_query * 1e6:.1f} us per range, "
+          f"monthly rollup {per_rollup * 1e3:.2f} ms")
+
+
+def _mysql_stand_in():
+    """In-memory SQLite with the tables of StockManager.setup_database."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE products (code_prod INT PRIMARY KEY, nom_prod VARCHAR(255), description TEXT, "
+                 "quantite INT, prix_unit DECIMAL(10, 2), status VARCHAR(50), updated_at DATETIME, "
+                 "synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("CREATE TABLE orders (code_cmd INT PRIMARY KEY, details TEXT, status VARCHAR(50), "
+                 "payment_status VARCHAR(50), delivery_status VARCHAR(50), created_at DATETIME, updated_at DATETIME, "
+                 "paid_at DATETIME, delivered_at DATETIME, paid_amount DECIMAL(10, 2), "
+                 "synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    return conn
+
+
+def bench_db_export(n_products=50_000, n_orders=100_000):
+    """Per-row REPLACE INTO (former exporter) vs BatchExporter, on a local MySQL stand-in."""
+    from db_export import BatchExporter, PRODUCT_COLUMNS, ORDER_COLUMNS, product_row, order_row
+    print("--- DB export (SQLite stand-in) ---")
+    manager = build_manager(n_products, n_orders)
+
+    def legacy():
+        conn = _mysql_stand_in()
+        cursor = conn.cursor()
+        product_sql = f"REPLACE INTO products ({', '.join(PRODUCT_COLUMNS)}) VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))})"
+        order_sql = f"REPLACE INTO orders ({', '.join(ORDER_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_COLUMNS))})"
+        for p in manager.products:
+            cursor.execute(product_sql, product_row(p))
+        for o in manager.orders:
+            cursor.execute(order_sql, order_row(o))
+        conn.commit()
+
+    legacy_time = timed(legacy, 1)
+    rows = n_products + n_orders
+    print(f"{'per-row':>12}: {legacy_time:.2f}s ({rows / legacy_time:.0f} rows/s), {rows} round trips")
+    for chunk_size in (100, 1000, 10_000):
+        conn = _mysql_stand_in()
+        report = BatchExporter(conn, chunk_size, paramstyle="qmark").export(manager.products, manager.orders)
+        assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == n_orders
+        round_trips = -(-n_products // chunk_size) - (-n_orders // chunk_size)
+        print(f"{'chunk ' + str(chunk_size):>12}: {report.seconds:.2f}s ({report.rows_per_sec:.0f} rows/s), "
+              f"{round_trips} round trips")
+    print("(in-process SQLite has no network: against MySQL each round trip adds the server latency)")
+
+
+def bench_analytics(n_lines=1_200_000, lines_per_order=3):
+    """Pure-Python group-bys vs the NumPy columnar path, results must be identical."""
+    try:
+        from analytics import OrderLineColumns
+    except ImportError:
+        print("--- Analytics: NumPy not installed, skipped ---")
+        return
+    print("--- Analytics (pure Python vs NumPy) ---")
+    n_orders = n_lines // lines_per_order
+    manager = build_manager(2_000, n_orders, lines_per_order)
+    start_day = datetime.datetime(2022, 1, 1)
+    for order in manager.orders:
+        order.status = random.choice(list(OrderStatus))
+        if random.random() < 0.6:
+            order.payment_status = PaymentStatus.PAID
+            order.paid_at = start_day + datetime.timedelta(minutes=random.randint(0, 3 * 365 * 24 * 60))
+        for line in order.lines:
+            line.quantity = random.randint(1, 20)
+            line.price_at_order_time = round(random.uniform(0.5, 200), 2)
+    label = lambda code: manager.get_product(code).nom_prod
+
+    export = timed(lambda: OrderLineColumns(manager.orders, label), 1)
+    columns = OrderLineColumns(manager.orders, label)
+    cases = [
+        ("revenue_by_product", lambda: _python_revenue_by_product(manager.orders, label), columns.revenue_by_product),
+        ("most_ordered", lambda: _python_most_ordered(manager.orders, label), columns.most_ordered_products),
+        ("revenue_over_time", lambda: _python_revenue_over_time(manager.orders), columns.revenue_over_time),
+    ]
+    print(f"{n_lines} lines, one-off column export {export:.2f}s")
+    for name, python_impl, numpy_impl in cases:
+        assert python_impl() == numpy_impl(), name
+        if name != "revenue_over_time":
+            # Top-k must keep the same tie order as the full ranking
+            expected = python_impl()
+            for k in (1, 5, 10, 100):
+                assert expected[:k] == numpy_impl(k), (name, k)
+        py, vec = timed(python_impl, 1), timed(numpy_impl, 3)
+        print(f"{name:>20}: python {py:.3f}s, numpy {vec:.3f}s ({py / vec:.0f}x, identical results)")
+
+
+if __name__ == "__main__":
+    bench_lookups()
+    bench_product_listing()
+    bench_snapshot_write()
+    bench_storage()
+    bench_mutation_latency()
+    bench_memory()
+    bench_db_export()
+    bench_revenue_ranges()
+    bench_analytics()
@@ -0,0 +1,154 @@
+"""
+Batched export of products and orders to the MySQL mirror, and the
+conversion of its rows back to records.
+
+Rows are sent with executemany in chunks of `chunk_size` (mysql.connector
+turns each chunk into one multi-row statement) and the whole export is one
+transaction. Any DB-API connection works, so the exporter can be pointed at
+a local stand-in:
+    BatchExporter(sqlite3.connect(":memory:"), paramstyle="qmark").export(products, orders)
+"""
+import datetime
+import json
+import time
+from models import Product, Order, OrderLine, OrderStatus, PaymentStatus, DeliveryStatus
+
+PRODUCT_COLUMNS = ("code_prod", "nom_prod", "description", "quantite", "prix_unit", "status", "updated_at")
+ORDER_COLUMNS = ("code_cmd", "details", "status", "payment_status", "delivery_status", "created_at", "updated_at",
+                 "paid_at", "delivered_at", "paid_amount")
+
+_PLACEHOLDERS = {"format": "%s", "pyformat": "%s", "qmark": "?"}
+
+
+def _seconds(value):
+    # Whole seconds like the JSON snapshots: DATETIME would round the fraction up
+    return value.replace(microsecond=0) if value else value
+
+
+def product_row(p):
+    return (p.code_prod, p.nom_prod, p.description, p.quantite, p.prix_unit, p.status.value, _seconds(p.updated_at))
+
+
+def order_row(o):
+    details_json = json.dumps([line.to_dict() for line in o.lines])
+    return (o.code_cmd, details_json, o.status.value, o.payment_status.value, o.delivery_status.value,
+            _seconds(o.created_at), _seconds(o.updated_at), _seconds(o.paid_at), _seconds(o.delivered_at),
+            o.paid_amount)
+
+
+def db_date(value, fallback=None):
+    """mysql.connector returns datetimes, other drivers may return ISO strings."""
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return fallback
+    return value
+
+
+def product_from_row(row):
+    """Product from a dictionary-cursor row of the products table."""
+    return Product(
+        row['code_prod'], row['nom_prod'], row['description'],
+        row['quantite'], float(row['prix_unit']), row['status'],
+        updated_at=db_date(row.get('updated_at'))
+    )
+
+
+def order_from_row(row):
+    """
+    Order from a dictionary-cursor row of the orders table; unknown statuses
+    and the columns of rows exported before they existed fall back to the defaults.
+    """
+    o = Order(row['code_cmd'])
+    o.lines = [OrderLine.from_dict(l) for l in json.loads(row['details'])]
+    try:
+        o.status = OrderStatus(row['status'])
+    except ValueError:
+        o.status = OrderStatus.DRAFT
+    try:
+        o.payment_status = PaymentStatus(row['payment_status'])
+    except ValueError:
+        o.payment_status = PaymentStatus.UNPAID
+    try:
+        o.delivery_status = DeliveryStatus(row.get('delivery_status'))
+    except ValueError:
+        o.delivery_status = DeliveryStatus.NOT_SHIPPED
+    o.created_at = db_date(row['created_at'], datetime.datetime.now())
+    o.updated_at = db_date(row['updated_at'], o.created_at)
+    o.paid_at = db_date(row.get('paid_at'))
+    o.delivered_at = db_date(row.get('delivered_at'))
+    o.paid_amount = float(row.get('paid_amount') or 0.0)
+    return o
+
+
+class ExportReport:
+    def __init__(self, products, orders, seconds):
+        self.products = products
+        self.orders = orders
+        self.seconds = seconds
+
+    @property
+    def rows(self):
+        return self.products + self.orders
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self):
+        return f"{self.products} produits, {self.orders} commandes en {self.seconds:.2f}s ({self.rows_per_sec:.0f} lignes/s)"
+
+
+class BatchExporter:
+    def __init__(self, conn, chunk_size=1000, paramstyle="format", upsert="replace"):
+        """
+        conn: DB-API connection (mysql.connector, or sqlite3 as a stand-in).
+        upsert: "replace" (REPLACE INTO, MySQL and SQLite) or "duplicate_key"
+        (INSERT ... ON DUPLICATE KEY UPDATE, MySQL only).
+        """
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.placeholder = _PLACEHOLDERS[paramstyle]
+        self.upsert = upsert
+
+    def statement(self, table, columns):
+        """Built once per table, not once per row."""
+        values = ", ".join([self.placeholder] * len(columns))
+        if self.upsert == "duplicate_key":
+            updates = ", ".join(f"{c} = VALUES({c})" for c in columns[1:])
+            return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values}) ON DUPLICATE KEY UPDATE {updates}"
+        return f"REPLACE INTO {table} ({', '.join(columns)}) VALUES ({values})"
+
+    def _send(self, cursor, sql, rows):
+        sent = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                cursor.executemany(sql, chunk)
+                sent += len(chunk)
+                chunk = []
+        if chunk:
+            cursor.executemany(sql, chunk)
+            sent += len(chunk)
+        return sent
+
+    def export(self, products=(), orders=()):
+        """Upserts the records in one transaction, rolled back on error. Returns an ExportReport."""
+        return self.export_rows(map(product_row, products), map(order_row, orders))
+
+    def export_rows(self, product_rows=(), order_rows=()):
+        """Same as export() for rows already built with product_row / order_row."""
+        start = time.perf_counter()
+        cursor = self.conn.cursor()
+        try:
+            n_products = self._send(cursor, self.statement("products", PRODUCT_COLUMNS), product_rows)
+            n_orders = self._send(cursor, self.statement("orders", ORDER_COLUMNS), order_rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return ExportReport(n_products, n_orders, time.perf_counter() - start)
@@ -0,0 +1,147 @@
+"""
+Pool of MySQL connections for StockManager.
+
+Each database operation checks a connection out for its own duration, so
+the GUI thread and the replication worker never share one:
+    pool = ConnectionPool({"host": "localhost", "user": "root", "password": "", "database": "stock_db"})
+    with pool.connection() as conn:
+        ...
+A connection idle for more than `check_after` seconds is pinged before it
+is handed out and replaced if the server dropped it (wait_timeout, server
+restart). One dropped sooner only shows when it is used: run() then retries
+the operation once on a fresh connection:
+    rows = pool.run(lambda conn: fetch(conn))
+Every release rolls back what the block left uncommitted, so an idle
+connection holds no transaction; one that cannot be rolled back is
+discarded.
+"""
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import Error, InterfaceError, OperationalError
+
+
+class ConnectionPool:
+    def __init__(self, config, size=4, timeout=10.0, check_after=30.0, connect=None, alive=None):
+        """
+        config: keyword arguments of connect().
+        size: most connections open at once; checkouts beyond it wait up to
+        `timeout` seconds for a free one.
+        connect / alive: connection factory and health check, mysql.connector
+        and is_connected() (a server ping) by default.
+        """
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._connect = connect or mysql.connector.connect
+        self._alive = alive or (lambda conn: conn.is_connected())
+        self._cond = threading.Condition()
+        self._idle = [] # (connection, time.monotonic() of its release), most recent last
+        self._open = 0
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        """Checks out a healthy connection for the duration of the block."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            # Also after a read-only block: autocommit is off, so the first SELECT
+            # opened a transaction whose snapshot would hide later remote changes
+            self._release(conn, broken=not self._rollback(conn))
+
+    def run(self, operation):
+        """
+        Returns operation(conn) on a checked-out connection. If it fails because
+        the connection is dead, it is discarded and the operation retried once
+        on a fresh one, so `operation` must be safe to repeat (one transaction,
+        or reads). Other errors are raised as they are.
+        """
+        for retry in (True, False):
+            conn = self._acquire()
+            dead = False
+            try:
+                return operation(conn)
+            except (InterfaceError, OperationalError):
+                # Also raised by live connections (lock wait timeout...): ping to tell them apart
+                dead = not self._is_alive(conn)
+                if not (retry and dead):
+                    raise
+            finally:
+                self._release(conn, broken=dead or not self._rollback(conn))
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise Error("Connection pool closed.")
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Error(f"No free database connection after {self.timeout:g}s (pool of {self.size}).")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    # Most recently used first: the least likely to have timed out
+                    conn, released = self._idle.pop()
+                else:
+                    conn, released = None, None
+                    self._open += 1
+
+            if conn is None:
+                try:
+                    return self._connect(**self.config)
+                except BaseException:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            if time.monotonic() - released < self.check_after or self._is_alive(conn):
+                return conn
+            self._discard(conn)
+
+    def _is_alive(self, conn):
+        try:
+            return self._alive(conn)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _rollback(conn):
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _release(self, conn, broken=False):
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            return {"size": self.size, "open": self._open, "idle": len(self._idle)}
+
+    def close(self):
+        """Closes the idle connections; the checked-out ones are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
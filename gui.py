@@ -1,11 +1,15 @@
 import sys
 import os
+import datetime
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QTabWidget, QLabel, QLineEdit, QPushButton, QTableWidget, 
-                             QTableWidgetItem, QMessageBox, QComboBox, QHeaderView, QGroupBox, QFormLayout, QProgressBar, QCheckBox, QSplitter, QScrollArea, QFrame, QListWidget, QListWidgetItem)
-from PyQt6.QtCore import Qt, QSize, QPoint, QRectF
+                             QTableWidgetItem, QMessageBox, QComboBox, QHeaderView, QGroupBox, QFormLayout, QProgressBar, QCheckBox, QSplitter, QScrollArea, QFrame, QListWidget, QListWidgetItem,
+                             QTableView, QAbstractItemView)
+from PyQt6.QtCore import Qt, QSize, QPoint, QRectF, QTimer
 from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QFont, QLinearGradient, QPainterPath
 from manager import StockManager
+from models import OrderStatus
+from table_models import ProductTableModel, OrderTableModel, RecordFilterProxyModel
 
 class WelcomeTab(QWidget):
     def __init__(self, manager, status_bar, refresh_callback=None):
@@ -80,6 +84,13 @@ class WelcomeTab(QWidget):
         self.chk_auto_sync.stateChanged.connect(self.toggle_auto_sync)
         db_layout.addWidget(self.chk_auto_sync)
 
+        # Replication queue, polled while Auto-Sync is on
+        self.lbl_sync_status = QLabel("")
+        self.lbl_sync_status.setStyleSheet("color: #aaa; margin-left: 5px;")
+        db_layout.addWidget(self.lbl_sync_status)
+        self.sync_status_timer = QTimer(self)
+        self.sync_status_timer.timeout.connect(self.update_sync_status)
+
         # Buttons
         btn_layout = QHBoxLayout()
         
@@ -167,6 +178,19 @@ class WelcomeTab(QWidget):
         self.manager.auto_sync = self.chk_auto_sync.isChecked()
         state = "activée" if self.manager.auto_sync else "désactivée"
         self.status_bar.showMessage(f"Synchro Auto {state}")
+        if self.manager.auto_sync:
+            self.sync_status_timer.start(1000)
+            self.update_sync_status()
+        else:
+            self.sync_status_timer.stop()
+            self.lbl_sync_status.setText("")
+
+    def update_sync_status(self):
+        status = self.manager.replication_status()
+        text = f"En attente: {status['depth']} | Retard: {status['lag']:.0f}s"
+        if status['last_error']:
+            text += f" | Erreur: {status['last_error']} (nouvel essai dans {status['retry_in']:.0f}s)"
+        self.lbl_sync_status.setText(text)
 
     def sync_data(self):
         success, msg = self.manager.sync_data()
@@ -392,7 +416,8 @@ class MainWindow(QMainWindow):
             }}
         """)
 
-        self.manager = StockManager()
+        # Interactive edits are coalesced into one write per half second
+        self.manager = StockManager(flush_delay=0.5)
         
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
@@ -414,6 +439,10 @@ class MainWindow(QMainWindow):
         # Refresh other tabs when changed
         self.tabs.currentChanged.connect(self.on_tab_change)
 
+    def closeEvent(self, event):
+        self.manager.close()
+        super().closeEvent(event)
+
     def refresh_app_data(self):
         """Reloads data in all tabs."""
         self.product_tab.load_products()
@@ -447,11 +476,14 @@ class ProductTab(QWidget):
         self.input_desc = QLineEdit()
         self.input_qty = QLineEdit()
         self.input_price = QLineEdit()
+        self.input_seuil = QLineEdit()
+        self.input_seuil.setPlaceholderText("Par défaut")
         
         self.form_layout.addRow("Nom:", self.input_nom)
         self.form_layout.addRow("Description:", self.input_desc)
         self.form_layout.addRow("Quantité:", self.input_qty)
         self.form_layout.addRow("Prix:", self.input_price)
+        self.form_layout.addRow("Seuil d'alerte:", self.input_seuil)
         
         self.btn_add = QPushButton("Ajouter")
         self.btn_add.setObjectName("primaryBtn")
@@ -475,17 +507,27 @@ class ProductTab(QWidget):
         self.form_group.setLayout(self.form_layout)
         self.layout.addWidget(self.form_group)
         
+        filter_layout = QHBoxLayout()
         self.chk_show_archived = QCheckBox("Afficher les archives")
         self.chk_show_archived.stateChanged.connect(self.on_archive_mode_changed)
-        self.layout.addWidget(self.chk_show_archived)
-
-        # --- Table ---
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Code", "Nom", "Description", "Quantité", "Prix"])
+        self.input_search = QLineEdit()
+        self.input_search.setPlaceholderText("Rechercher...")
+        filter_layout.addWidget(self.chk_show_archived)
+        filter_layout.addWidget(self.input_search)
+        self.layout.addLayout(filter_layout)
+
+        # --- Table (model/view: rows are rendered on demand) ---
+        self.product_model = ProductTableModel(self)
+        self.product_proxy = RecordFilterProxyModel(self.product_model, self)
+        self.input_search.textChanged.connect(self.product_proxy.set_filter_text)
+        self.table = QTableView()
+        self.table.setModel(self.product_proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(1, Qt.SortOrder.AscendingOrder)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.itemClicked.connect(self.fill_form_from_selection)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.clicked.connect(self.fill_form_from_selection)
         self.layout.addWidget(self.table)
         
         self.load_products()
@@ -510,25 +552,15 @@ class ProductTab(QWidget):
         self.clear_form_inputs()
 
     def load_products(self):
-        self.table.setRowCount(0)
-        
         if self.chk_show_archived.isChecked():
             products = self.manager.get_archived_products()
         else:
             products = self.manager.get_all_products_sorted()
-            
-        for p in products:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(str(p.code_prod)))
-            self.table.setItem(row, 1, QTableWidgetItem(p.nom_prod))
-            self.table.setItem(row, 2, QTableWidgetItem(p.description))
-            self.table.setItem(row, 3, QTableWidgetItem(str(p.quantite)))
-            self.table.setItem(row, 4, QTableWidgetItem(str(p.prix_unit)))
-            
-            if hasattr(p, 'status') and p.status.value == "ARCHIVED":
-                 for i in range(5):
-                     self.table.item(row, i).setForeground(Qt.GlobalColor.gray)
+        self.product_model.set_records(products)
+
+    def selected_product(self):
+        index = self.table.currentIndex()
+        return self.product_proxy.record(index) if index.isValid() else None
 
     def clear_form_inputs(self):
         """Clear form fields and table selection."""
@@ -536,15 +568,18 @@ class ProductTab(QWidget):
         self.input_desc.clear()
         self.input_qty.clear()
         self.input_price.clear()
+        self.input_seuil.clear()
         self.table.clearSelection()
 
     def fill_form_from_selection(self):
-        row = self.table.currentRow()
-        if row >= 0:
-            self.input_nom.setText(self.table.item(row, 1).text())
-            self.input_desc.setText(self.table.item(row, 2).text())
-            self.input_qty.setText(self.table.item(row, 3).text())
-            self.input_price.setText(self.table.item(row, 4).text())
+        product = self.selected_product()
+        if product:
+            self.input_nom.setText(product.nom_prod)
+            self.input_desc.setText(product.description)
+            self.input_qty.setText(str(product.quantite))
+            self.input_price.setText(str(product.prix_unit))
+            seuil = product.seuil_alerte
+            self.input_seuil.setText("" if seuil is None else str(seuil))
 
     def add_product(self):
         try:
@@ -552,33 +587,35 @@ class ProductTab(QWidget):
             desc = self.input_desc.text()
             qty = int(self.input_qty.text())
             price = float(self.input_price.text())
+            seuil = int(self.input_seuil.text()) if self.input_seuil.text() else None
             
             if not nom:
                 QMessageBox.warning(self, "Erreur", "Le nom est obligatoire.")
                 return
 
-            res = self.manager.add_product(nom, desc, qty, price)
+            res = self.manager.add_product(nom, desc, qty, price, seuil)
             if isinstance(res, str):
                  QMessageBox.warning(self, "Erreur", res)
             else:
-                 self.load_products()
+                 # The archive view does not list the new, active product
+                 if not self.chk_show_archived.isChecked():
+                     self.product_model.append(res)
                  self.clear_form_inputs()
                  self.status_bar.showMessage(f"Produit '{nom}' ajouté avec succès.", 3000)
         except ValueError:
             QMessageBox.warning(self, "Erreur", "Quantité et Prix doivent être des nombres.")
 
     def update_product(self):
-        row = self.table.currentRow()
-        if row < 0:
+        product = self.selected_product()
+        if not product:
             QMessageBox.warning(self, "Erreur", "Veuillez sélectionner un produit.")
             return
             
         try:
-            code = int(self.table.item(row, 0).text())
+            code = product.code_prod
             
             # Check if product is archived
-            product = self.manager.get_product(code)
-            if product and hasattr(product, 'status') and product.status.value == "ARCHIVED":
+            if product.status.value == "ARCHIVED":
                 QMessageBox.warning(self, "Erreur", "Impossible de modifier un produit archivé.")
                 return
             
@@ -586,10 +623,13 @@ class ProductTab(QWidget):
             desc = self.input_desc.text()
             qty = int(self.input_qty.text())
             price = float(self.input_price.text())
+            # Empty threshold: back to the global low-stock threshold
+            seuil = int(self.input_seuil.text()) if self.input_seuil.text() else -1
             
-            res = self.manager.update_product(code, nom, desc, qty, price)
+            res = self.manager.update_product(code, nom, desc, qty, price, seuil)
             if res is True:
-                self.load_products()
+                # Edited in place: repaint its row only
+                self.product_model.refresh(product)
                 self.clear_form_inputs()
                 self.status_bar.showMessage(f"Produit '{nom}' modifié.", 3000)
             elif isinstance(res, str):
@@ -601,12 +641,12 @@ class ProductTab(QWidget):
 
     def toggle_archive_selected(self):
         """Archive or unarchive a single selected product based on current mode."""
-        row = self.table.currentRow()
-        if row < 0:
+        product = self.selected_product()
+        if not product:
             QMessageBox.warning(self, "Erreur", "Veuillez sélectionner un produit.")
             return
             
-        code = int(self.table.item(row, 0).text())
+        code = product.code_prod
         is_archive_mode = self.chk_show_archived.isChecked()
         
         if is_archive_mode:
@@ -615,7 +655,7 @@ class ProductTab(QWidget):
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if confirm == QMessageBox.StandardButton.Yes:
                 if self.manager.unarchive_product(code):
-                    self.load_products()
+                    self.product_model.remove(product)
                     self.clear_form_inputs()
                     self.status_bar.showMessage("Produit désarchivé.", 3000)
         else:
@@ -624,7 +664,7 @@ class ProductTab(QWidget):
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if confirm == QMessageBox.StandardButton.Yes:
                 if self.manager.delete_product(code):
-                    self.load_products()
+                    self.product_model.remove(product)
                     self.clear_form_inputs()
                     self.status_bar.showMessage("Produit archivé.", 3000)
 
@@ -643,9 +683,10 @@ class ProductTab(QWidget):
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if confirm == QMessageBox.StandardButton.Yes:
                 count = 0
-                for p in products:
-                    if self.manager.unarchive_product(p.code_prod):
-                        count += 1
+                with self.manager.batch():
+                    for p in products:
+                        if self.manager.unarchive_product(p.code_prod):
+                            count += 1
                 self.load_products()
                 self.clear_form_inputs()
                 self.status_bar.showMessage(f"{count} produits désarchivés.", 3000)
@@ -660,9 +701,10 @@ class ProductTab(QWidget):
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if confirm == QMessageBox.StandardButton.Yes:
                 count = 0
-                for p in products:
-                    if self.manager.delete_product(p.code_prod):
-                        count += 1
+                with self.manager.batch():
+                    for p in products:
+                        if self.manager.delete_product(p.code_prod):
+                            count += 1
                 self.load_products()
                 self.clear_form_inputs()
                 self.status_bar.showMessage(f"{count} produits archivés.", 3000)
@@ -698,11 +740,21 @@ class OrderTab(QWidget):
         self.left_layout = QVBoxLayout()
         self.left_widget.setLayout(self.left_layout)
 
-        self.table_orders = QTableWidget()
-        self.table_orders.setColumnCount(6)
-        self.table_orders.setHorizontalHeaderLabels(["ID", "Status", "Paiement", "Livraison", "Total", "Date"])
-        self.table_orders.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table_orders.itemSelectionChanged.connect(self.on_order_selected)
+        self.input_search = QLineEdit()
+        self.input_search.setPlaceholderText("Rechercher...")
+        self.left_layout.addWidget(self.input_search)
+
+        self.order_model = OrderTableModel(self)
+        self.order_proxy = RecordFilterProxyModel(self.order_model, self)
+        self.input_search.textChanged.connect(self.order_proxy.set_filter_text)
+        self.table_orders = QTableView()
+        self.table_orders.setModel(self.order_proxy)
+        self.table_orders.setSortingEnabled(True)
+        self.table_orders.sortByColumn(0, Qt.SortOrder.DescendingOrder)
+        self.table_orders.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table_orders.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table_orders.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_orders.selectionModel().selectionChanged.connect(self.on_order_selected)
         self.left_layout.addWidget(self.table_orders)
 
         self.btn_archive = QPushButton("Archiver / Supprimer")
@@ -793,41 +845,31 @@ class OrderTab(QWidget):
             self.combo_prod.addItem(f"{p.nom_prod} (Stock: {p.quantite}) - {p.prix_unit}€", p.code_prod)
 
     def load_orders(self):
-        self.table_orders.setRowCount(0)
-        
         if self.chk_archived.isChecked():
-            orders_arch = self.manager.get_archived_orders()
-            orders_active = self.manager.get_active_orders()
-            orders = orders_active + orders_arch
+            orders = self.manager.get_active_orders() + self.manager.get_archived_orders()
         else:
             orders = self.manager.get_active_orders()
-            
-        orders.sort(key=lambda x: x.code_cmd, reverse=True)
-        
-        for o in orders:
-            row = self.table_orders.rowCount()
-            self.table_orders.insertRow(row)
-            self.table_orders.setItem(row, 0, QTableWidgetItem(str(o.code_cmd)))
-            self.table_orders.setItem(row, 1, QTableWidgetItem(o.status.value))
-            self.table_orders.setItem(row, 2, QTableWidgetItem(o.payment_status.value))
-            self.table_orders.setItem(row, 3, QTableWidgetItem(o.delivery_status.value))
-            self.table_orders.setItem(row, 4, QTableWidgetItem(f"{o.total_amount:.2f} €"))
-            self.table_orders.setItem(row, 5, QTableWidgetItem(o.created_at.strftime("%Y-%m-%d %H:%M") if o.created_at else ""))
-            
-            if o.status.value == "ARCHIVED" or o.status.value == "CANCELLED":
-                 for i in range(6):
-                     self.table_orders.item(row, i).setForeground(Qt.GlobalColor.gray)
+        # Display order (newest first) is the proxy's sort
+        self.order_model.set_records(orders)
+
+    def selected_order_row(self):
+        rows = self.table_orders.selectionModel().selectedRows()
+        return self.order_proxy.record(rows[0]) if rows else None
+
+    def refresh_order_row(self, order):
+        """Repaints one order after a transition; archived orders leave the active view."""
+        if order.status == OrderStatus.ARCHIVED and not self.chk_archived.isChecked():
+            self.order_model.remove(order)
+        else:
+            self.order_model.refresh(order)
 
     def on_order_selected(self):
-        row = self.table_orders.currentRow()
-        if row < 0:
+        order = self.selected_order_row()
+        if order is None:
             self.right_widget.setEnabled(False)
             return
         
         self.right_widget.setEnabled(True)
-        code_cmd = int(self.table_orders.item(row, 0).text())
-        order = self.manager.get_order(code_cmd)
-        if not order: return
 
         self.selected_order = order
         self.lbl_order_info.setText(f"Commande #{order.code_cmd} - {order.status.value}")
@@ -880,7 +922,7 @@ class OrderTab(QWidget):
         if isinstance(res, str):
              QMessageBox.warning(self, "Erreur", res)
         else:
-             self.load_orders()
+             self.order_model.append(res)
              self.status_bar.showMessage(f"Commande #{res.code_cmd} créée.", 3000)
 
     def add_line(self):
@@ -899,7 +941,7 @@ class OrderTab(QWidget):
             res = self.manager.add_line_to_order(self.selected_order.code_cmd, code_prod, qty)
             if res is True:
                 self.on_order_selected() # refresh details
-                self.load_orders() # refresh total (in list)
+                self.refresh_order_row(self.selected_order) # refresh total (in list)
                 self.status_bar.showMessage("Produit ajouté.", 2000)
             else:
                  QMessageBox.warning(self, "Erreur", str(res))
@@ -910,7 +952,7 @@ class OrderTab(QWidget):
         if not hasattr(self, 'selected_order'): return
         res = self.manager.confirm_order(self.selected_order.code_cmd)
         if res is True:
-            self.load_orders()
+            self.refresh_order_row(self.selected_order)
             self.on_order_selected()
             self.status_bar.showMessage("Commande CONFIRMÉE.", 3000)
         else:
@@ -920,7 +962,7 @@ class OrderTab(QWidget):
         if not hasattr(self, 'selected_order'): return
         res = self.manager.pay_order(self.selected_order.code_cmd)
         if res is True:
-            self.load_orders()
+            self.refresh_order_row(self.selected_order)
             self.on_order_selected()
             self.status_bar.showMessage("Commande PAYÉE (Stock déduit).", 3000)
         else:
@@ -930,7 +972,7 @@ class OrderTab(QWidget):
         if not hasattr(self, 'selected_order'): return
         res = self.manager.deliver_order(self.selected_order.code_cmd)
         if res is True:
-            self.load_orders()
+            self.refresh_order_row(self.selected_order)
             self.on_order_selected()
             self.status_bar.showMessage("Commande LIVRÉE.", 3000)
         else:
@@ -939,24 +981,22 @@ class OrderTab(QWidget):
     def cancel_order(self):
         if not hasattr(self, 'selected_order'): return
         if self.manager.cancel_order(self.selected_order.code_cmd):
-            self.load_orders()
+            self.refresh_order_row(self.selected_order)
             self.on_order_selected()
             self.status_bar.showMessage("Commande ANNULÉE.", 3000)
 
     def archive_order(self):
-        row = self.table_orders.currentRow()
-        if row < 0: return
-        code_cmd = int(self.table_orders.item(row, 0).text())
-        if self.manager.delete_order(code_cmd):
-            self.load_orders()
+        order = self.selected_order_row()
+        if order is None: return
+        if self.manager.delete_order(order.code_cmd):
+            self.refresh_order_row(order)
             self.status_bar.showMessage("Commande Archivée.", 3000)
 
     def unarchive_order(self):
-        row = self.table_orders.currentRow()
-        if row < 0: return
-        code_cmd = int(self.table_orders.item(row, 0).text())
-        if self.manager.unarchive_order(code_cmd):
-            self.load_orders()
+        order = self.selected_order_row()
+        if order is None: return
+        if self.manager.unarchive_order(order.code_cmd):
+            self.refresh_order_row(order)
             self.status_bar.showMessage("Commande Désarchivée.", 3000)
 
 # --- CUSTOM DASHBOARD WIDGETS ---
@@ -1202,6 +1242,21 @@ class StatsTab(QWidget):
         # Revenue Over Time
         line_group = QGroupBox("Évolution du Revenu (Paiements)")
         line_layout = QVBoxLayout()
+        zoom_layout = QHBoxLayout()
+        self.combo_granularity = QComboBox()
+        for label, granularity in (("Jour", "day"), ("Semaine", "week"), ("Mois", "month"), ("Trimestre", "quarter")):
+            self.combo_granularity.addItem(label, granularity)
+        self.combo_period = QComboBox()
+        for label, days in (("Tout", None), ("30 derniers jours", 30), ("90 derniers jours", 90), ("12 derniers mois", 365)):
+            self.combo_period.addItem(label, days)
+        self.lbl_period_total = QLabel()
+        self.combo_granularity.currentIndexChanged.connect(self.load_revenue_trend)
+        self.combo_period.currentIndexChanged.connect(self.load_revenue_trend)
+        zoom_layout.addWidget(self.combo_granularity)
+        zoom_layout.addWidget(self.combo_period)
+        zoom_layout.addStretch()
+        zoom_layout.addWidget(self.lbl_period_total)
+        line_layout.addLayout(zoom_layout)
         self.line_chart = LineChartWidget()
         line_layout.addWidget(self.line_chart)
         line_group.setLayout(line_layout)
@@ -1219,6 +1274,9 @@ class StatsTab(QWidget):
             }
         """)
         activity_layout.addWidget(self.list_activity)
+        self.btn_more_activity = QPushButton("Voir plus")
+        self.btn_more_activity.clicked.connect(self.load_more_activity)
+        activity_layout.addWidget(self.btn_more_activity)
         activity_group.setLayout(activity_layout)
         
         bottom_layout.addWidget(line_group, 2)
@@ -1240,9 +1298,9 @@ class StatsTab(QWidget):
         
         # 2. Update Charts
         self.pie_chart.set_data(self.manager.get_order_status_distribution())
-        self.top_prod_chart.set_data(self.manager.get_most_ordered_products())
-        self.rev_prod_chart.set_data(self.manager.get_revenue_by_product())
-        self.line_chart.set_data(self.manager.get_revenue_over_time())
+        self.top_prod_chart.set_data(self.manager.get_most_ordered_products(k=5))
+        self.rev_prod_chart.set_data(self.manager.get_revenue_by_product(k=5))
+        self.load_revenue_trend()
         
         # 3. Update Stock Table
         self.table_stock.setRowCount(0)
@@ -1262,7 +1320,12 @@ class StatsTab(QWidget):
             
         # 4. Update Activity Feed
         self.list_activity.clear()
-        activities = self.manager.get_recent_activity()
+        self.load_more_activity()
+
+    def load_more_activity(self):
+        # Next page of the activity log, older events appended below
+        activities = self.manager.get_recent_activity(limit=10, offset=self.list_activity.count())
+        self.btn_more_activity.setEnabled(len(activities) == 10)
         for act in activities:
             item_text = f"[{act['timestamp'].strftime('%H:%M')}] {act['message']}"
             item = QListWidgetItem(item_text)
@@ -1272,3 +1335,10 @@ class StatsTab(QWidget):
                 item.setForeground(QColor("#00d4ff"))
             self.list_activity.addItem(item)
 
+    def load_revenue_trend(self):
+        # Served by the revenue index: one lookup per bucket, no order rescan
+        granularity = self.combo_granularity.currentData()
+        days = self.combo_period.currentData()
+        start = datetime.date.today() - datetime.timedelta(days=days - 1) if days else None
+        self.line_chart.set_data(self.manager.get_revenue_over_time(granularity, start))
+        self.lbl_period_total.setText(f"Total: {self.manager.get_revenue_between(start):.2f} DT")
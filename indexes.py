@@ -0,0 +1,183 @@
+"""
+In-memory bookkeeping structures used by StockManager.
+"""
+import bisect
+import heapq
+from models import ProductStatus
+
+
+class IdSequence:
+    """Monotonic code allocator: a code is never handed out twice."""
+
+    def __init__(self, last=0):
+        self.last = last
+
+    def allocate(self):
+        self.last += 1
+        return self.last
+
+    def reserve(self, count):
+        """Reserves a contiguous block of codes for a batch insert."""
+        start = self.last + 1
+        self.last += count
+        return range(start, self.last + 1)
+
+    def observe(self, code):
+        """Moves the sequence past a code that was created elsewhere (import, sync)."""
+        if code > self.last:
+            self.last = code
+
+
+class StockLevelIndex:
+    """
+    Active products bucketed by stock level, moved between buckets as their
+    quantity changes: "low" under the reorder threshold (the product's own
+    seuil_alerte, else `low`), "healthy" from `healthy` units up, "medium"
+    in between. Counts are O(1) and listings O(result).
+    """
+    LEVELS = ("low", "medium", "healthy")
+
+    def __init__(self, low=10, healthy=50):
+        self.low = low
+        self.healthy = healthy
+        self.rebuild([])
+
+    def rebuild(self, products):
+        self._levels = {}
+        self._buckets = {level: {} for level in self.LEVELS} # level -> {code_prod: Product}
+        for p in products:
+            self.update(p)
+
+    def level_of(self, product):
+        threshold = self.low if product.seuil_alerte is None else product.seuil_alerte
+        if product.quantite < threshold:
+            return "low"
+        if product.quantite >= self.healthy:
+            return "healthy"
+        return "medium"
+
+    def update(self, product):
+        """Moves a product to the bucket matching its current quantity/status."""
+        old = self._levels.pop(product.code_prod, None)
+        if old is not None:
+            del self._buckets[old][product.code_prod]
+        if product.status == ProductStatus.ACTIVE:
+            level = self.level_of(product)
+            self._levels[product.code_prod] = level
+            self._buckets[level][product.code_prod] = product
+
+    def level(self, code_prod):
+        """Level of an active product, None for archived/unknown codes."""
+        return self._levels.get(code_prod)
+
+    def count(self, level):
+        return len(self._buckets[level])
+
+    def products(self, level):
+        return list(self._buckets[level].values())
+
+
+class SortedProductViews:
+    """
+    Products of each status kept sorted by lowercased name (code as a tie
+    breaker) with bisect insertion, so listings need no sort and a name
+    prefix is found in O(log n).
+    """
+
+    def __init__(self):
+        self.rebuild([])
+
+    def rebuild(self, products):
+        self._keys = {status: [] for status in ProductStatus}     # sorted (name, code) keys
+        self._products = {status: [] for status in ProductStatus} # products, same positions
+        self._current = {} # code_prod -> (status, key) the product is filed under
+        for p in sorted(products, key=self._key):
+            key = self._key(p)
+            self._keys[p.status].append(key)
+            self._products[p.status].append(p)
+            self._current[p.code_prod] = (p.status, key)
+
+    @staticmethod
+    def _key(product):
+        return (product.nom_prod.lower(), product.code_prod)
+
+    def update(self, product):
+        """Refiles a product after an insert, a rename or a status change."""
+        new = (product.status, self._key(product))
+        old = self._current.get(product.code_prod)
+        if old == new:
+            return
+        if old is not None:
+            status, key = old
+            pos = bisect.bisect_left(self._keys[status], key)
+            del self._keys[status][pos]
+            del self._products[status][pos]
+        status, key = new
+        pos = bisect.bisect_left(self._keys[status], key)
+        self._keys[status].insert(pos, key)
+        self._products[status].insert(pos, product)
+        self._current[product.code_prod] = new
+
+    def list(self, status):
+        return list(self._products[status])
+
+    def page(self, status, prefix="", offset=0, limit=None):
+        """Products whose name starts with `prefix` (case-insensitive), in name order."""
+        prefix = prefix.lower()
+        keys = self._keys[status]
+        start = bisect.bisect_left(keys, (prefix,)) + offset
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        result = []
+        for pos in range(start, stop):
+            if not keys[pos][0].startswith(prefix):
+                break
+            result.append(self._products[status][pos])
+        return result
+
+
+class OrderPartitions:
+    """
+    Order codes partitioned by OrderStatus, PaymentStatus and DeliveryStatus,
+    each partition kept in code order. A transition moves the code to its new
+    partitions, so counts are O(1) and a listing costs the partition size.
+    """
+    FIELDS = ("status", "payment_status", "delivery_status")
+
+    def __init__(self):
+        self.rebuild([])
+
+    def rebuild(self, orders):
+        self._partitions = {field: {} for field in self.FIELDS} # field -> value -> sorted codes
+        self._current = {} # code_cmd -> (status, payment_status, delivery_status)
+        for o in sorted(orders, key=lambda o: o.code_cmd):
+            self.update(o)
+
+    def update(self, order):
+        """Moves an order to the partitions of its current statuses."""
+        code = order.code_cmd
+        new = (order.status, order.payment_status, order.delivery_status)
+        old = self._current.get(code, (None, None, None))
+        if old == new:
+            return
+        for field, old_value, new_value in zip(self.FIELDS, old, new):
+            if old_value == new_value:
+                continue
+            if old_value is not None:
+                codes = self._partitions[field][old_value]
+                del codes[bisect.bisect_left(codes, code)]
+            bisect.insort(self._partitions[field].setdefault(new_value, []), code)
+        self._current[code] = new
+
+    def count(self, field, value):
+        return len(self._partitions[field].get(value, ()))
+
+    def counts(self, field):
+        """{value string: count} for the non-empty partitions of a field."""
+        return {value.value: len(codes) for value, codes in self._partitions[field].items() if codes}
+
+    def codes(self, field, values):
+        """Codes in any of the given partitions of a field, in code order."""
+        parts = [self._partitions[field].get(value, []) for value in values]
+        if len(parts) == 1:
+            return list(parts[0])
+        return list(heapq.merge(*parts))
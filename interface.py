@@ -27,6 +27,7 @@ class ConsoleInterface:
             elif choice == '2':
                 self.order_menu()
             elif choice == '3':
+                self.manager.close()
                 print("Au revoir!")
                 break
             else:
@@ -82,11 +83,17 @@ class ConsoleInterface:
                 print(f"{p.code_prod:<5} {p.nom_prod:<20} {p.quantite:<5} {p.prix_unit:<10} {p.description}")
         input("\nAppuyez sur Entrée pour continuer...")
 
+    def ask_product(self, prompt):
+        """Reads a product code or name and returns the matching product."""
+        answer = input(prompt).strip()
+        if answer.isdigit():
+            return self.manager.get_product(int(answer))
+        return self.manager.find_product_by_name(answer)
+
     def update_product_view(self):
         self.print_header("MODIFIER PRODUIT")
         try:
-            code = int(input("Code du produit à modifier: "))
-            prod = self.manager.get_product(code)
+            prod = self.ask_product("Code ou nom du produit à modifier: ")
             if not prod:
                 print("Produit introuvable.")
             else:
@@ -99,23 +106,26 @@ class ConsoleInterface:
                 
                 price_str = input(f"Nouveau prix ({prod.prix_unit}): ")
                 price = float(price_str) if price_str else prod.prix_unit
+
+                seuil_str = input(f"Nouveau seuil d'alerte ({prod.seuil_alerte if prod.seuil_alerte is not None else 'défaut'}, -1 = défaut): ")
+                seuil = int(seuil_str) if seuil_str else None
                 
-                self.manager.update_product(code, nom, desc, qty, price)
-                print("Produit mis à jour.")
+                res = self.manager.update_product(prod.code_prod, nom, desc, qty, price, seuil)
+                if isinstance(res, str):
+                    print(f"Erreur: {res}")
+                else:
+                    print("Produit mis à jour.")
         except ValueError:
             print("Erreur de saisie.")
         input("\nAppuyez sur Entrée pour continuer...")
 
     def delete_product_view(self):
         self.print_header("SUPPRIMER PRODUIT")
-        try:
-            code = int(input("Code du produit à supprimer: "))
-            if self.manager.delete_product(code):
-                print("Produit supprimé.")
-            else:
-                print("Produit introuvable.")
-        except ValueError:
-            print("Erreur de saisie.")
+        prod = self.ask_product("Code ou nom du produit à supprimer: ")
+        if prod and self.manager.delete_product(prod.code_prod):
+            print("Produit supprimé.")
+        else:
+            print("Produit introuvable.")
         input("\nAppuyez sur Entrée pour continuer...")
 
     # --- Order Views ---
@@ -1,98 +1,382 @@
 import json
 import os
 import datetime
+import threading
+from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import Error
 from models import Product, Order, OrderLine, OrderStatus, PaymentStatus, ProductStatus, DeliveryStatus
+from indexes import IdSequence, OrderPartitions, SortedProductViews, StockLevelIndex
+from storage import ActivityLog, Journal, JsonStorage, atomic_file
+from stats import DashboardStats, top_by_label
+from db_export import BatchExporter, PRODUCT_COLUMNS, ORDER_COLUMNS, product_row, order_row, product_from_row, order_from_row, db_date
+from replication import ReplicationWorker
+from db_pool import ConnectionPool
 
 class StockManager:
-    def __init__(self, products_file="products.json", orders_file="orders.json"):
+    def __init__(self, products_file="products.json", orders_file="orders.json", use_journal=True, compact_every=1000,
+                 flush_delay=0, backups=1, lazy_archive=False, storage=None, stock_thresholds=(10, 50)):
         self.products_file = products_file
         self.orders_file = orders_file
+        # Snapshot backend (JsonStorage by default, see storage.py for the others)
+        self.storage = storage if storage is not None else JsonStorage(products_file, orders_file, backups)
+        self.ids_file = os.path.join(os.path.dirname(products_file), "ids.json")
+        # Write-ahead journal: mutations are appended there and folded into
+        # the snapshots every `compact_every` records. Incremental backends
+        # (SQLite) persist each flush themselves and need no journal.
+        use_journal = use_journal and not self.storage.incremental
+        self.journal = Journal(os.path.join(os.path.dirname(products_file), "journal.jsonl")) if use_journal else None
+        self.compact_every = compact_every
+        # lazy_archive: archived orders stay on disk until something needs them
+        self.lazy_archive = lazy_archive
+        self._archived_pending = set()
+        # Records changed since the last flush, keyed by code
+        self._dirty_products = {}
+        self._dirty_orders = {}
+        self._batch_depth = 0
+        # flush_delay > 0 coalesces the writes of that many seconds into one flush
+        self.flush_delay = flush_delay
+        self._flush_timer = None
+        self._lock = threading.RLock()
         self.products = []
         self.orders = []
-        self.auto_sync = False # Feature flag for real-time sync
+        # Code-keyed lookup tables, kept in step with self.products / self.orders
+        self._products_by_code = {}
+        self._orders_by_code = {}
+        # Casefolded name -> Product, archived products keep their name reserved
+        self._products_by_name = {}
+        # Active / archived products kept in name order
+        self.product_views = SortedProductViews()
+        # Order codes by status, payment status and delivery status
+        self.order_partitions = OrderPartitions()
+        # Last allocated codes, persisted so codes are never reused
+        self.product_ids = IdSequence()
+        self.order_ids = IdSequence()
+        # Dashboard aggregates, updated on every committed change
+        self.stats = DashboardStats()
+        # Active products by stock level, (low, healthy) thresholds in units
+        self.stock_levels = StockLevelIndex(*stock_thresholds)
+        # Recent-activity feed, fed by the order mutations
+        self.activity = ActivityLog(os.path.join(os.path.dirname(products_file), "activity.jsonl"))
+        # Auto-sync: committed changes are pushed to MySQL by a background worker
+        self._auto_sync = False
+        self.replication = ReplicationWorker(self.export_json_to_db)
+        # MySQL connections, checked out per operation (see db_pool.py)
+        self.db_pool = None
+        self.db_pool_size = 4
+        # One export at a time: each one moves the watermark to the start of its snapshot
+        self._export_lock = threading.Lock()
+        # Rows per executemany batch when exporting to MySQL
+        self.export_chunk_size = 1000
+        self.last_export = None
+        # Codes changed since the last successful export, and per database the
+        # high-water mark of that export ("host/db" -> time, in sync_state.json)
+        self._unexported_products = set()
+        self._unexported_orders = set()
+        self._oldest_unexported = None
+        self._scanned_target = None
+        # Above this many codes the queue is dropped and the next export scans updated_at instead
+        self.max_unexported = 100_000
+        # sync_data re-reads rows stamped this long before its mark: synced_at is
+        # set when a row is written, and an export transaction commits later
+        self.sync_overlap = datetime.timedelta(seconds=60)
+        self.sync_state_file = os.path.join(os.path.dirname(products_file), "sync_state.json")
+        self._sync_state = {}
         self.load_data()
 
     def load_data(self):
-        # Load Products
-        if os.path.exists(self.products_file):
+        self.products, self.orders, self._archived_pending = self.storage.load(self.lazy_archive)
+
+        if self.journal:
+            self._replay_journal()
+
+        self._rebuild_indexes()
+        self._load_sequences()
+        self._load_sync_state()
+        if not self.activity.load():
+            self._seed_activity()
+
+    def _load_archive(self):
+        """Pages in the archived orders skipped by a lazy load."""
+        if not self._archived_pending:
+            return
+        with self._lock:
+            orders = self.storage.load_archived(self._archived_pending)
+            for order in orders:
+                self.orders.append(order)
+                self._orders_by_code[order.code_cmd] = order
+            self._archived_pending = set()
+            self._reindex(orders=orders)
+
+    def _replay_journal(self):
+        """Applies the journaled upserts on top of the loaded snapshot."""
+        products = {p.code_prod: p for p in self.products}
+        orders = {o.code_cmd: o for o in self.orders}
+        for product_records, order_records in self.journal.replay():
+            for data in product_records:
+                try:
+                    products[data["code_prod"]] = Product.from_dict(data)
+                except (KeyError, TypeError, ValueError):
+                    continue
+            for data in order_records:
+                try:
+                    orders[data["code_cmd"]] = Order.from_dict(data)
+                except (KeyError, TypeError, ValueError):
+                    continue
+        self.products = list(products.values())
+        self.orders = list(orders.values())
+        self._archived_pending.difference_update(orders)
+
+    def _load_sequences(self):
+        last_product, last_order = 0, 0
+        if os.path.exists(self.ids_file):
             try:
-                with open(self.products_file, 'r') as f:
+                with open(self.ids_file, 'r') as f:
                     data = json.load(f)
-                    self.products = [Product.from_dict(item) for item in data]
-            except (json.JSONDecodeError, KeyError, TypeError):
-                self.products = []
-        
-        # Load Orders
-        # Warning: Schema changed. Old orders might fail to load.
-        if os.path.exists(self.orders_file):
+                    last_product = data.get("products", 0)
+                    last_order = data.get("orders", 0)
+            except (json.JSONDecodeError, AttributeError):
+                pass
+        self.product_ids = IdSequence(last_product)
+        self.order_ids = IdSequence(last_order)
+        self._observe_codes()
+
+    def _observe_codes(self):
+        """Moves both sequences past the highest codes currently loaded."""
+        self.product_ids.observe(max((p.code_prod for p in self.products), default=0))
+        self.order_ids.observe(max((o.code_cmd for o in self.orders), default=0))
+        self.order_ids.observe(max(self._archived_pending, default=0))
+
+    def _load_sync_state(self):
+        self._sync_state = {}
+        if os.path.exists(self.sync_state_file):
             try:
-                with open(self.orders_file, 'r') as f:
-                    data = json.load(f)
-                    self.orders = []
-                    for item in data:
-                        try:
-                            self.orders.append(Order.from_dict(item))
-                        except Exception:
-                            # Skip malformed/old version orders to avoid crash
-                            continue
-            except json.JSONDecodeError:
-                self.orders = []
+                with open(self.sync_state_file, 'r') as f:
+                    self._sync_state = {target: marks for target, marks in json.load(f).items() if isinstance(marks, dict)}
+            except (json.JSONDecodeError, OSError, AttributeError):
+                pass
+
+    def _seed_activity(self):
+        """Rebuilds the activity feed from the order history (first start, full import)."""
+        self._load_archive()
+        events = []
+        for o in self.orders:
+            if o.created_at:
+                events.append((o.created_at, "order_created", o.code_cmd, o.total_amount))
+            if o.paid_at and o.payment_status == PaymentStatus.PAID:
+                events.append((o.paid_at, "payment", o.code_cmd, o.total_amount))
+            if o.delivered_at:
+                events.append((o.delivered_at, "order_delivered", o.code_cmd, o.total_amount))
+            if o.status == OrderStatus.CANCELLED and o.updated_at:
+                # cancel_order records the cancellation at the order's updated_at
+                events.append((o.updated_at, "order_cancelled", o.code_cmd, o.total_amount))
+        self.activity.seed(events)
+
+    def _rebuild_indexes(self):
+        """Rebuilds the code -> record lookup tables from the current lists."""
+        self._products_by_code = {p.code_prod: p for p in self.products}
+        self._orders_by_code = {o.code_cmd: o for o in self.orders}
+        self._products_by_name = {self._name_key(p.nom_prod): p for p in self.products}
+        self.stats.rebuild(self.products, self.orders)
+        self.stock_levels.rebuild(self.products)
+        self.product_views.rebuild(self.products)
+        self.order_partitions.rebuild(self.orders)
+
+    def _reindex(self, products=(), orders=()):
+        """Brings the derived structures up to date with changed records."""
+        for p in products:
+            self.stats.apply_product(p)
+            self.stock_levels.update(p)
+            self.product_views.update(p)
+        for o in orders:
+            self.stats.apply_order(o)
+            self.order_partitions.update(o)
+
+    @staticmethod
+    def _name_key(nom):
+        return nom.casefold()
+
+    def _rename_product(self, product, nom):
+        """Renames a product and moves its entry in the name index."""
+        old_key = self._name_key(product.nom_prod)
+        if self._products_by_name.get(old_key) is product:
+            del self._products_by_name[old_key]
+        product.nom_prod = nom
+        self._products_by_name[self._name_key(nom)] = product
 
     def save_data(self):
-        with open(self.products_file, 'w') as f:
-            json.dump([p.to_dict() for p in self.products], f, indent=4)
-        
-        with open(self.orders_file, 'w') as f:
-            json.dump([o.to_dict() for o in self.orders], f, indent=4)
+        """Writes full snapshots of both collections and compacts the journal."""
+        with self._lock:
+            self._cancel_flush_timer()
+            self._dirty_products.clear()
+            self._dirty_orders.clear()
+
+            # Backends write to a temp file + fsync + rename: a crash never leaves a truncated snapshot
+            self.storage.save(self.products, self.orders, self._archived_pending)
+
+            with atomic_file(self.ids_file) as f:
+                json.dump({"products": self.product_ids.last, "orders": self.order_ids.last}, f)
+
+            if self.journal:
+                self.journal.truncate()
+            self.activity.flush()
+
+    def _commit(self, products=(), orders=(), events=()):
+        """
+        Marks the records touched by a mutation as dirty and flushes them unless
+        deferred. events are (timestamp, type, code_cmd, amount) for the activity
+        feed, recorded under the lock the flush timer also takes.
+        """
+        with self._lock:
+            for event in events:
+                self.activity.record(*event)
+            # Whole seconds, the precision of MySQL DATETIME and of the snapshots:
+            # last-writer-wins in sync_data compares these stamps with pulled rows
+            now = datetime.datetime.now().replace(microsecond=0)
+            for p in products:
+                p.updated_at = now
+            for o in orders:
+                o.updated_at = now
+            self._reindex(products, orders)
+            for p in products:
+                self._dirty_products[p.code_prod] = p
+            for o in orders:
+                self._dirty_orders[o.code_cmd] = o
+            self._queue_export([p.code_prod for p in products], [o.code_cmd for o in orders], now)
+
+            if self._batch_depth:
+                return
+            if self.flush_delay > 0:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """Writes all pending changes in one go."""
+        with self._lock:
+            self._cancel_flush_timer()
+            self.activity.flush()
+            if not self._dirty_products and not self._dirty_orders:
+                return
+            if self.storage.incremental:
+                self.storage.write(self._dirty_products.values(), self._dirty_orders.values())
+                self._dirty_products.clear()
+                self._dirty_orders.clear()
+            elif self.journal:
+                self.journal.append(self._dirty_products.values(), self._dirty_orders.values())
+                self._dirty_products.clear()
+                self._dirty_orders.clear()
+                if self.journal.count >= self.compact_every:
+                    self.save_data()
+            else:
+                self.save_data()
             
-        # Auto-Sync Trigger
         if self.auto_sync:
-            try:
-                # We don't want to show a popup here as it might be frequent, 
-                # just print to console or log. 
-                # If disconnected, export_json_to_db returns False but handles it gracefully.
-                self.export_json_to_db()
-            except Exception as e:
-                print(f"Auto-Sync Warning: {e}")
+            # Pushed by the replication worker: saving never waits on MySQL
+            self.replication.notify()
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups several mutations into a single flush:
+            with manager.batch():
+                for p in products: manager.delete_product(p.code_prod)
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
+
+    def close(self):
+        """Flushes pending changes and releases the journal file and storage."""
+        self.flush()
+        self.replication.stop()
+        if self.db_pool is not None:
+            self.db_pool.close()
+        if self.journal:
+            self.journal.close()
+        self.storage.close()
+
+    def _sql_aggregates(self):
+        """True when the dashboard queries can be pushed down to the storage backend."""
+        if not self.storage.aggregates:
+            return False
+        self.flush()
+        return not self._dirty_products and not self._dirty_orders
 
     # --- Product Management ---
-    def add_product(self, nom, description, quantite, prix):
+    def add_product(self, nom, description, quantite, prix, seuil_alerte=None):
         # Unique Name Check (Case Insensitive)
-        for p in self.products:
-            if p.nom_prod.lower() == nom.lower():
-                return "Un produit avec ce nom existe déjà."
+        if self.find_product_by_name(nom):
+            return "Un produit avec ce nom existe déjà."
                 
-        # Auto-increment code_prod
-        new_code = 1
-        if self.products:
-            new_code = max(p.code_prod for p in self.products) + 1
-        
-        new_product = Product(new_code, nom, description, quantite, prix)
+        new_code = self.product_ids.allocate()
+        new_product = Product(new_code, nom, description, quantite, prix, seuil_alerte=seuil_alerte)
         self.products.append(new_product)
-        self.save_data()
+        self._products_by_code[new_code] = new_product
+        self._products_by_name[self._name_key(nom)] = new_product
+        self._commit(products=[new_product])
         return new_product
 
+    def add_products(self, items):
+        """
+        Bulk insert of (nom, description, quantite, prix) tuples with a single save.
+        Nothing is inserted if one of the names is already taken.
+        """
+        items = list(items)
+        seen = set()
+        for nom, _, _, _ in items:
+            key = self._name_key(nom)
+            if key in seen or key in self._products_by_name:
+                return f"Un produit avec ce nom existe déjà: {nom}"
+            seen.add(key)
+
+        new_products = []
+        for code, (nom, description, quantite, prix) in zip(self.product_ids.reserve(len(items)), items):
+            product = Product(code, nom, description, quantite, prix)
+            self.products.append(product)
+            self._products_by_code[code] = product
+            self._products_by_name[self._name_key(nom)] = product
+            new_products.append(product)
+        self._commit(products=new_products)
+        return new_products
+
     def get_product(self, code_prod):
-        for p in self.products:
-            if p.code_prod == code_prod:
-                return p
-        return None
+        return self._products_by_code.get(code_prod)
+
+    def find_product_by_name(self, nom):
+        """Case-insensitive lookup by product name (active or archived)."""
+        return self._products_by_name.get(self._name_key(nom))
 
-    def update_product(self, code_prod, nom=None, description=None, quantite=None, prix=None):
+    def update_product(self, code_prod, nom=None, description=None, quantite=None, prix=None, seuil_alerte=None):
+        """seuil_alerte: reorder threshold of the product, -1 to fall back to the global one."""
         product = self.get_product(code_prod)
         if product:
             if nom:
                 # Check uniqueness if name changed
-                for p in self.products:
-                    if p.code_prod != code_prod and p.nom_prod.lower() == nom.lower():
-                        return "Un produit avec ce nom existe déjà."
-                product.nom_prod = nom
+                existing = self.find_product_by_name(nom)
+                if existing and existing.code_prod != code_prod:
+                    return "Un produit avec ce nom existe déjà."
+                self._rename_product(product, nom)
             if description: product.description = description
             if quantite is not None: product.quantite = quantite
             if prix is not None: product.prix_unit = prix
-            self.save_data()
+            if seuil_alerte is not None: product.seuil_alerte = None if seuil_alerte < 0 else seuil_alerte
+            self._commit(products=[product])
             return True
         return False
 
@@ -101,23 +385,28 @@ class StockManager:
         product = self.get_product(code_prod)
         if product:
             product.status = ProductStatus.ARCHIVED
-            self.save_data()
+            self._commit(products=[product])
             return True
         return False
 
     def get_all_products_sorted(self):
-        # Active only
-        return sorted([p for p in self.products if p.status == ProductStatus.ACTIVE], key=lambda p: p.nom_prod.lower())
+        # Active only, already in name order (see self.product_views)
+        return self.product_views.list(ProductStatus.ACTIVE)
 
     def get_archived_products(self):
-        return sorted([p for p in self.products if p.status == ProductStatus.ARCHIVED], key=lambda p: p.nom_prod.lower())
+        return self.product_views.list(ProductStatus.ARCHIVED)
+
+    def search_products(self, prefix="", offset=0, limit=None, archived=False):
+        """Products whose name starts with prefix (case-insensitive), in name order, one page at a time."""
+        status = ProductStatus.ARCHIVED if archived else ProductStatus.ACTIVE
+        return self.product_views.page(status, prefix, offset, limit)
 
     def unarchive_product(self, code_prod):
         # Restore archived product to active
         product = self.get_product(code_prod)
         if product and product.status == ProductStatus.ARCHIVED:
             product.status = ProductStatus.ACTIVE
-            self.save_data()
+            self._commit(products=[product])
             return True
         return False
 
@@ -140,13 +429,12 @@ class StockManager:
         # Create Line
         line = OrderLine(code_prod, quantite, product.prix_unit)
         
-        new_code = 1
-        if self.orders:
-            new_code = max(o.code_cmd for o in self.orders) + 1
-            
+        new_code = self.order_ids.allocate()
         new_order = Order(new_code, lines=[line], status=OrderStatus.DRAFT)
         self.orders.append(new_order)
-        self.save_data()
+        self._orders_by_code[new_code] = new_order
+        self._commit(orders=[new_order],
+                     events=[(new_order.created_at, "order_created", new_code, new_order.total_amount)])
         return new_order
 
     def add_line_to_order(self, code_cmd, code_prod, quantite):
@@ -169,17 +457,14 @@ class StockManager:
         if (current_in_order + quantite) > product.quantite:
              return f"Stock insuffisant. Total demandé: {current_in_order + quantite}, Stock: {product.quantite}"
 
-        # Check if line exists, merge?
-        existing_line = next((l for l in order.lines if l.code_prod == code_prod), None)
-        if existing_line:
-            existing_line.quantity += quantite
-        else:
-            line = OrderLine(code_prod, quantite, product.prix_unit)
-            order.lines.append(line)
+        # Merges into the existing line for this product, if any
+        self.stats.lines_changing(order)
+        order.add_line(code_prod, quantite, product.prix_unit)
             
         order.updated_at = datetime.datetime.now()
-        self.save_data()
+        self._commit(orders=[order])
         return True
+
     def confirm_order(self, code_cmd):
         order = self.get_order(code_cmd)
         if not order:
@@ -195,9 +480,9 @@ class StockManager:
                 return f"Stock insuffisant pour le produit #{line.code_prod}"
 
         order.status = OrderStatus.CONFIRMED
-        self.check_and_deduct_stock(order)
+        touched = self.check_and_deduct_stock(order)
         order.updated_at = datetime.datetime.now()
-        self.save_data()
+        self._commit(products=touched, orders=[order])
         return True
 
     def pay_order(self, code_cmd, amount=None):
@@ -209,6 +494,7 @@ class StockManager:
         if amount is None:
             amount = order.total_amount
 
+        was_paid = order.payment_status == PaymentStatus.PAID
         order.paid_amount += amount
         order.paid_at = datetime.datetime.now()
         
@@ -217,9 +503,12 @@ class StockManager:
         elif order.paid_amount > 0:
             order.payment_status = PaymentStatus.PARTIALLY_PAID
             
-        self.check_and_deduct_stock(order)
+        touched = self.check_and_deduct_stock(order)
         order.updated_at = datetime.datetime.now()
-        self.save_data()
+        events = []
+        if order.payment_status == PaymentStatus.PAID and not was_paid:
+            events.append((order.paid_at, "payment", order.code_cmd, order.total_amount))
+        self._commit(products=touched, orders=[order], events=events)
         return True
 
     def deliver_order(self, code_cmd):
@@ -246,13 +535,16 @@ class StockManager:
         order.delivery_status = DeliveryStatus.DELIVERED
         order.delivered_at = datetime.datetime.now()
         order.updated_at = datetime.datetime.now()
-        self.save_data()
+        self._commit(orders=[order],
+                     events=[(order.delivered_at, "order_delivered", order.code_cmd, order.total_amount)])
         return True
 
     def check_and_deduct_stock(self, order):
         """
         Subtract stock only when OrderStatus = CONFIRMED and PaymentStatus = PAID
+        Returns the products whose stock was changed.
         """
+        touched = []
         if order.status == OrderStatus.CONFIRMED and order.payment_status == PaymentStatus.PAID:
             # Check if stock was already deducted? 
             # We need a flag 'stock_deducted' or imply it from status. 
@@ -281,6 +573,7 @@ class StockManager:
                 for line in order.lines:
                     prod = self.get_product(line.code_prod)
                     prod.quantite -= line.quantity
+                    touched.append(prod)
                 
                 # Auto-update delivery status to ready/pending shipping? 
                 # User didn't request auto-shipping.
@@ -288,6 +581,7 @@ class StockManager:
                 # Rollback or Error?
                 # If paid but no stock, we have a problem. 
                 pass
+        return touched
 
     def cancel_order(self, code_cmd):
         """
@@ -300,23 +594,26 @@ class StockManager:
         # User said "rollback logic before payment confirmation".
         # So we freely cancel if not CONFIRMED+PAID.
         
+        touched = []
         if order.status == OrderStatus.CONFIRMED and order.payment_status == PaymentStatus.PAID:
              # Need to restock if we cancel a paid confirmed order?
              # User said "Subtract stock only when...", so if we cancel, we add it back.
              for line in order.lines:
                  prod = self.get_product(line.code_prod)
-                 if prod: prod.quantite += line.quantity
+                 if prod:
+                     prod.quantite += line.quantity
+                     touched.append(prod)
         
         order.status = OrderStatus.CANCELLED
         order.updated_at = datetime.datetime.now()
-        self.save_data()
+        self._commit(products=touched, orders=[order],
+                     events=[(order.updated_at, "order_cancelled", order.code_cmd, order.total_amount)])
         return True
         
     def get_order(self, code_cmd):
-        for o in self.orders:
-            if o.code_cmd == code_cmd:
-                return o
-        return None
+        if code_cmd in self._archived_pending:
+            self._load_archive()
+        return self._orders_by_code.get(code_cmd)
 
     def delete_order(self, code_cmd):
         # User: "instead of delete always add archive"
@@ -326,18 +623,59 @@ class StockManager:
         if order:
             order.status = OrderStatus.ARCHIVED
             order.updated_at = datetime.datetime.now()
-            self.save_data()
+            self._commit(orders=[order])
             return True
         return False
 
     def get_active_orders(self):
-        # Filter out Archived
-        return [o for o in self.orders if o.status != OrderStatus.ARCHIVED]
+        # Every status partition but Archived
+        return self.get_orders_by_status([s for s in OrderStatus if s != OrderStatus.ARCHIVED])
 
     def get_archived_orders(self):
-        return [o for o in self.orders if o.status == OrderStatus.ARCHIVED]
+        return self.get_orders_by_status(OrderStatus.ARCHIVED)
+
+    @staticmethod
+    def _status_filters(status, payment_status, delivery_status):
+        # [(field, [values])] for the given filters, a filter being one status or a list of them
+        filters = []
+        for field, values in zip(OrderPartitions.FIELDS, (status, payment_status, delivery_status)):
+            if values is not None:
+                filters.append((field, list(values) if isinstance(values, (list, tuple, set)) else [values]))
+        return filters
+
+    def get_orders_by_status(self, status=None, payment_status=None, delivery_status=None):
+        """
+        Orders matching the given OrderStatus / PaymentStatus / DeliveryStatus
+        (each a single value or a list), in code order. Only the smallest
+        matching partition is read.
+        """
+        filters = self._status_filters(status, payment_status, delivery_status)
+        # Archived orders may still be on disk (lazy_archive)
+        if status is None or OrderStatus.ARCHIVED in dict(filters)["status"]:
+            self._load_archive()
+        if not filters:
+            return list(self.orders)
+        field, values = min(filters, key=lambda f: sum(self.order_partitions.count(f[0], v) for v in f[1]))
+        orders = [self._orders_by_code[code] for code in self.order_partitions.codes(field, values)]
+        for other_field, other_values in filters:
+            if other_field != field:
+                orders = [o for o in orders if getattr(o, other_field) in other_values]
+        return orders
+
+    def count_orders(self, status=None, payment_status=None, delivery_status=None):
+        """Number of orders matching the filters, O(1) for a single status."""
+        filters = self._status_filters(status, payment_status, delivery_status)
+        if len(filters) != 1 or len(filters[0][1]) != 1:
+            return len(self.get_orders_by_status(status, payment_status, delivery_status))
+        field, (value,) = filters[0]
+        if field == "status":
+            pending = len(self._archived_pending) if value == OrderStatus.ARCHIVED else 0
+            return self.order_partitions.count(field, value) + pending
+        self._load_archive()
+        return self.order_partitions.count(field, value)
 
     def get_all_orders_history(self):
+        self._load_archive()
         return self.orders 
 
     def unarchive_order(self, code_cmd):
@@ -346,144 +684,194 @@ class StockManager:
         if order and order.status == OrderStatus.ARCHIVED:
             order.status = OrderStatus.DRAFT
             order.updated_at = datetime.datetime.now()
-            self.save_data()
+            self._commit(orders=[order])
             return True
         return False
 
 
-    def get_most_ordered_products(self):
-        # Returns list of (product_name, total_qty)
-        stats = {}
-        for order in self.orders:
-            # Skip invalid/cancelled orders? Or include all demand?
-            # Usually stats include all valid sales.
-            if order.status == OrderStatus.CANCELLED or order.status == OrderStatus.ARCHIVED:
+    def _product_label(self, code_prod):
+        prod = self.get_product(code_prod)
+        return prod.nom_prod if prod else f"Unknown ({code_prod})"
+
+    def get_most_ordered_products(self, k=None, statuses=None, start=None, end=None):
+        """
+        Returns list of (product_name, total_qty), best first, only the k first if k is given.
+        By default cancelled/archived orders are excluded; statuses restricts the
+        orders to the given OrderStatus values and start/end to a creation date window.
+        """
+        if statuses is None and start is None and end is None:
+            return self.stats.most_ordered(self._product_label, k)
+        if statuses is None:
+            statuses = [s for s in OrderStatus if s not in (OrderStatus.CANCELLED, OrderStatus.ARCHIVED)]
+        totals = self._product_totals(statuses, start, end, revenue=False)
+        return top_by_label(totals.items(), self._product_label, k)
+
+    def _product_totals(self, statuses, start, end, revenue):
+        """
+        Quantity (or paid revenue) per product over the orders matching the
+        filters; dates are creation dates for quantities, payment dates for revenue.
+        """
+        statuses = None if statuses is None else {OrderStatus(s) for s in statuses}
+        if statuses is None or OrderStatus.ARCHIVED in statuses:
+            self._load_archive()
+        start, end = self._day_ordinal(start), self._day_ordinal(end)
+        totals = {}
+        for o in self.orders:
+            if statuses is not None and o.status not in statuses:
                 continue
-                
-            for line in order.lines:
-                prod = self.get_product(line.code_prod)
-                name = prod.nom_prod if prod else f"Unknown ({line.code_prod})"
-                stats[name] = stats.get(name, 0) + line.quantity
-        
-        sorted_stats = sorted(stats.items(), key=lambda item: item[1], reverse=True)
-        return sorted_stats
+            if revenue and o.payment_status != PaymentStatus.PAID:
+                continue
+            if start is not None or end is not None:
+                moment = o.paid_at if revenue else o.created_at
+                if moment is None:
+                    continue
+                day = moment.toordinal()
+                if (start is not None and day < start) or (end is not None and day > end):
+                    continue
+            for line in o.lines:
+                totals[line.code_prod] = totals.get(line.code_prod, 0) + (line.total if revenue else line.quantity)
+        return totals
 
     # ========== NEW DASHBOARD STATISTICS METHODS ==========
+    # Served from self.stats, kept up to date by _commit: no rescan of the history
 
     def get_dashboard_kpis(self):
         """Returns dict with total revenue, active orders, products count, low stock count."""
-        total_revenue = 0.0
-        active_orders = 0
-        
-        for order in self.orders:
-            if order.status not in [OrderStatus.CANCELLED, OrderStatus.ARCHIVED]:
-                active_orders += 1
-                if order.payment_status == PaymentStatus.PAID:
-                    total_revenue += order.total_amount
-        
-        active_products = len(self.get_all_products_sorted())
-        
-        # Low stock: products with quantity < 10
-        low_stock_count = sum(1 for p in self.get_all_products_sorted() if p.quantite < 10)
-        
-        return {
-            "total_revenue": total_revenue,
-            "active_orders": active_orders,
-            "active_products": active_products,
-            "low_stock_count": low_stock_count
-        }
+        kpis = self.stats.kpis()
+        kpis["low_stock_count"] = self.stock_levels.count("low")
+        return kpis
 
     def get_order_status_distribution(self):
         """Returns dict of status -> count for pie/donut chart."""
-        distribution = {}
-        for order in self.orders:
-            status = order.status.value
-            distribution[status] = distribution.get(status, 0) + 1
+        # Archived orders still on disk: let an SQL backend count everything
+        if self._archived_pending and self._sql_aggregates():
+            with self._lock:
+                return self.storage.order_status_distribution()
+        distribution = self.order_partitions.counts("status")
+        if self._archived_pending:
+            archived = OrderStatus.ARCHIVED.value
+            distribution[archived] = distribution.get(archived, 0) + len(self._archived_pending)
         return distribution
 
-    def get_revenue_over_time(self):
-        """Returns list of (date_str, revenue) tuples for line chart, grouped by day."""
-        daily_revenue = {}
-        
-        for order in self.orders:
-            if order.payment_status == PaymentStatus.PAID and order.paid_at:
-                date_str = order.paid_at.strftime("%Y-%m-%d")
-                daily_revenue[date_str] = daily_revenue.get(date_str, 0) + order.total_amount
-        
-        # Sort by date
-        sorted_data = sorted(daily_revenue.items(), key=lambda x: x[0])
-        return sorted_data
+    @staticmethod
+    def _day_ordinal(value):
+        # date, datetime or "YYYY-MM-DD" -> day ordinal (None stays unbounded)
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = datetime.date.fromisoformat(value[:10])
+        return value.toordinal()
+
+    def get_revenue_over_time(self, granularity="day", start=None, end=None):
+        """
+        Returns list of (label, revenue) tuples for line chart, grouped by
+        granularity ("day", "week", "month" or "quarter"), optionally limited
+        to the days between start and end (inclusive).
+        """
+        self._load_archive()
+        return self.stats.revenue_over_time(granularity, self._day_ordinal(start), self._day_ordinal(end))
+
+    def get_revenue_between(self, start=None, end=None):
+        """Returns the paid revenue between two dates (inclusive), by payment day."""
+        self._load_archive()
+        return self.stats.revenue_index.total(self._day_ordinal(start), self._day_ordinal(end))
 
     def get_stock_levels(self):
         """Returns list of products with stock info and status (healthy/medium/low)."""
         levels = []
         for p in self.get_all_products_sorted():
-            # Determine status based on quantity thresholds
-            if p.quantite >= 50:
-                status = "healthy"
-            elif p.quantite >= 10:
-                status = "medium"
-            else:
-                status = "low"
-            
+            # Level maintained by self.stock_levels as quantities change
             levels.append({
                 "name": p.nom_prod,
                 "quantity": p.quantite,
-                "status": status
+                "status": self.stock_levels.level(p.code_prod)
             })
         return levels
 
+    def get_low_stock_products(self):
+        """Active products under their reorder threshold, O(number of such products)."""
+        return self.stock_levels.products("low")
+
+    def set_stock_thresholds(self, low, healthy):
+        """Changes the global low/healthy thresholds (products keep their own seuil_alerte)."""
+        with self._lock:
+            self.stock_levels.low = low
+            self.stock_levels.healthy = healthy
+            self.stock_levels.rebuild(self.products)
+
     def get_payment_status_summary(self):
         """Returns dict of payment status -> count."""
-        summary = {}
-        for order in self.orders:
-            if order.status not in [OrderStatus.CANCELLED, OrderStatus.ARCHIVED]:
-                status = order.payment_status.value
-                summary[status] = summary.get(status, 0) + 1
-        return summary
-
-    def get_recent_activity(self, limit=10):
-        """Returns list of recent events (orders, payments) with timestamps."""
-        activities = []
-        
-        for order in self.orders:
-            # Order creation
-            if order.created_at:
-                activities.append({
-                    "type": "order_created",
-                    "message": f"Commande #{order.code_cmd} créée",
-                    "timestamp": order.created_at,
-                    "amount": order.total_amount
-                })
-            
-            # Payment
-            if order.paid_at and order.payment_status == PaymentStatus.PAID:
-                activities.append({
-                    "type": "payment",
-                    "message": f"Commande #{order.code_cmd} payée - {order.total_amount:.2f}DT",
-                    "timestamp": order.paid_at,
-                    "amount": order.total_amount
-                })
-        
-        # Sort by timestamp descending (most recent first)
-        activities.sort(key=lambda x: x["timestamp"], reverse=True)
-        return activities[:limit]
+        return dict(self.stats.payment_counts)
 
-    def get_revenue_by_product(self):
-        """Returns list of (product_name, total_revenue) for revenue breakdown."""
-        revenue_map = {}
-        
-        for order in self.orders:
-            if order.payment_status == PaymentStatus.PAID:
-                for line in order.lines:
-                    prod = self.get_product(line.code_prod)
-                    name = prod.nom_prod if prod else f"Unknown ({line.code_prod})"
-                    revenue_map[name] = revenue_map.get(name, 0) + line.total
-        
-        sorted_revenue = sorted(revenue_map.items(), key=lambda x: x[1], reverse=True)
-        return sorted_revenue
+    _ACTIVITY_MESSAGES = {
+        "order_created": "Commande #{code} créée",
+        "payment": "Commande #{code} payée - {amount:.2f}DT",
+        "order_delivered": "Commande #{code} livrée",
+        "order_cancelled": "Commande #{code} annulée",
+    }
+
+    def get_recent_activity(self, limit=10, offset=0):
+        """
+        Returns list of recent events (orders, payments...) with timestamps, most
+        recent first. offset skips that many events to page back through the feed.
+        """
+        with self._lock:
+            events = self.activity.page(offset, limit)
+        result = []
+        for timestamp, kind, code_cmd, amount in events:
+            if kind == "order_created":
+                # A draft grows after its creation event: show what it amounts to now
+                order = self._orders_by_code.get(code_cmd)
+                if order is not None:
+                    amount = order.total_amount
+            result.append({
+                "type": kind,
+                "message": self._ACTIVITY_MESSAGES[kind].format(code=code_cmd, amount=amount),
+                "timestamp": timestamp,
+                "amount": amount
+            })
+        return result
+
+    def get_revenue_by_product(self, k=None, statuses=None, start=None, end=None):
+        """
+        Returns list of (product_name, total_revenue) for revenue breakdown, paid
+        orders only, best first (k first if given). statuses restricts the
+        OrderStatus values, start/end the payment date window.
+        """
+        if statuses is not None or start is not None or end is not None:
+            totals = self._product_totals(statuses, start, end, revenue=True)
+            return top_by_label(totals.items(), self._product_label, k)
+        if self._archived_pending and self._sql_aggregates():
+            with self._lock:
+                return self.storage.revenue_by_product(k)
+        self._load_archive()
+        return self.stats.revenue_by_product(self._product_label, k)
 
     # --- DATABASE INTEGRATION ---
+    @property
+    def auto_sync(self):
+        return self._auto_sync
+
+    @auto_sync.setter
+    def auto_sync(self, enabled):
+        self._auto_sync = enabled
+        if enabled:
+            # Also sends what an earlier session left unsent
+            self.replication.notify()
+
+    def replication_status(self):
+        """Auto-sync queue: records waiting, age of the oldest unsent change (s), failed attempts, last error."""
+        with self._lock:
+            depth = len(self._unexported_products) + len(self._unexported_orders)
+            oldest = self._oldest_unexported
+        return {
+            "depth": depth,
+            "lag": (datetime.datetime.now() - oldest).total_seconds() if oldest else 0.0,
+            "failures": self.replication.failures,
+            "retry_in": self.replication.retry_in() if self.replication.failures else 0.0,
+            "last_error": self.replication.last_error,
+        }
+
     def connect_db(self, host, user, password, database_name):
         """Establishes connection to MySQL database, creating it if it doesn't exist."""
         try:
@@ -502,10 +890,19 @@ class StockManager:
                 'host': host,
                 'user': user,
                 'password': password,
-                'database': database_name
+                'database': database_name,
+                'connection_timeout': 10
             }
-            self.db_conn = mysql.connector.connect(**self.db_config)
+            pool = ConnectionPool(self.db_config, self.db_pool_size)
+            # Opens the first connection, so a wrong host or password fails here
+            with pool.connection():
+                pass
+            if self.db_pool is not None:
+                self.db_pool.close()
+            self.db_pool = pool
             print(f"Connected to database: {database_name}")
+            if self.auto_sync:
+                self.replication.notify()
             return True, "Connected successfully."
         except Error as e:
             print(f"Error connecting to DB: {e}")
@@ -513,189 +910,357 @@ class StockManager:
 
     def setup_database(self):
         """Creates necessary tables in the database."""
-        if not hasattr(self, 'db_conn') or not self.db_conn.is_connected():
+        if self.db_pool is None:
             return False, "Not connected to database."
         
         try:
-            cursor = self.db_conn.cursor()
-            
-            # Products Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    code_prod INT PRIMARY KEY,
-                    nom_prod VARCHAR(255),
-                    description TEXT,
-                    quantite INT,
-                    prix_unit DECIMAL(10, 2),
-                    status VARCHAR(50)
-                )
-            """)
-            
-            # Orders Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS orders (
-                    code_cmd INT PRIMARY KEY,
-                    details TEXT,
-                    status VARCHAR(50),
-                    payment_status VARCHAR(50),
-                    created_at DATETIME,
-                    updated_at DATETIME
-                )
-            """)
-            
-            self.db_conn.commit()
+            # CREATE IF NOT EXISTS and column checks: safe to repeat on a fresh connection
+            self.db_pool.run(self._create_tables)
             return True, "Database tables setup successfully."
         except Error as e:
             return False, str(e)
 
-    def export_json_to_db(self):
-        """Exports current JSON data objects to MySQL."""
-        if not hasattr(self, 'db_conn') or not self.db_conn.is_connected():
-            return False, "Not connected to database."
-        
+    @staticmethod
+    def _create_tables(conn):
+        cursor = conn.cursor()
+
+        # Products Table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                code_prod INT PRIMARY KEY,
+                nom_prod VARCHAR(255),
+                description TEXT,
+                quantite INT,
+                prix_unit DECIMAL(10, 2),
+                status VARCHAR(50),
+                updated_at DATETIME,
+                synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_products_updated_at (updated_at),
+                INDEX idx_products_synced_at (synced_at)
+            )
+        """)
+        # Tables created before updated_at existed on products
+        cursor.execute("SHOW COLUMNS FROM products LIKE 'updated_at'")
+        if not cursor.fetchall():
+            cursor.execute("""
+                ALTER TABLE products
+                ADD COLUMN updated_at DATETIME,
+                ADD INDEX idx_products_updated_at (updated_at)
+            """)
+
+        # Orders Table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                code_cmd INT PRIMARY KEY,
+                details TEXT,
+                status VARCHAR(50),
+                payment_status VARCHAR(50),
+                delivery_status VARCHAR(50),
+                created_at DATETIME,
+                updated_at DATETIME,
+                paid_at DATETIME,
+                delivered_at DATETIME,
+                paid_amount DECIMAL(10, 2),
+                synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_orders_updated_at (updated_at),
+                INDEX idx_orders_synced_at (synced_at)
+            )
+        """)
+        # Tables created before the orders carried their payment and delivery
+        for column, definition in (("delivery_status", "VARCHAR(50)"), ("paid_at", "DATETIME"),
+                                   ("delivered_at", "DATETIME"), ("paid_amount", "DECIMAL(10, 2)")):
+            cursor.execute(f"SHOW COLUMNS FROM orders LIKE '{column}'")
+            if not cursor.fetchall():
+                cursor.execute(f"ALTER TABLE orders ADD COLUMN {column} {definition}")
+        cursor.execute("SHOW INDEX FROM orders WHERE Key_name = 'idx_orders_updated_at'")
+        if not cursor.fetchall():
+            cursor.execute("CREATE INDEX idx_orders_updated_at ON orders (updated_at)")
+
+        # sync_data pulls on synced_at, the server's write time: updated_at comes
+        # from the writer's clock and a late push would land below the pull marks
+        for table in ("products", "orders"):
+            cursor.execute(f"SHOW COLUMNS FROM {table} LIKE 'synced_at'")
+            if not cursor.fetchall():
+                cursor.execute(f"""
+                    ALTER TABLE {table}
+                    ADD COLUMN synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    ADD INDEX idx_{table}_synced_at (synced_at)
+                """)
+
+        conn.commit()
+
+    def _sync_target(self):
+        return f"{self.db_config['host']}/{self.db_config['database']}"
+
+    def _sync_mark(self, name):
+        """
+        High-water mark `name` of the connected database, None if never set:
+        "exported_at" (last successful export, local clock), "products_synced_at"
+        and "orders_synced_at" (latest server synced_at pulled by sync_data).
+        """
+        value = self._sync_state.get(self._sync_target(), {}).get(name)
         try:
-            cursor = self.db_conn.cursor()
-            
-            # Export Products
-            for p in self.products:
-                sql = """
-                    REPLACE INTO products (code_prod, nom_prod, description, quantite, prix_unit, status)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """
-                # FIX: use p.status.value
-                status_val = p.status.value if hasattr(p.status, 'value') else str(p.status)
-                val = (p.code_prod, p.nom_prod, p.description, p.quantite, p.prix_unit, status_val)
-                cursor.execute(sql, val)
-                
-            # Export Orders
-            for o in self.orders:
-                sql = """
-                    REPLACE INTO orders (code_cmd, details, status, payment_status, created_at, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """
-                # FIX: use o.lines instead of o.details, and line.to_dict()
-                details_json = json.dumps([line.to_dict() for line in o.lines])
-                
-                # FIX: use .value for Enums
-                status_val = o.status.value if hasattr(o.status, 'value') else str(o.status)
-                payment_val = o.payment_status.value if hasattr(o.payment_status, 'value') else str(o.payment_status)
-                
-                val = (o.code_cmd, details_json, status_val, payment_val, o.created_at, o.updated_at)
-                cursor.execute(sql, val)
+            return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S") if value else None
+        except (TypeError, ValueError):
+            return None
 
-            self.db_conn.commit()
-            return True, "Data exported to Database successfully."
-        except Error as e:
-            return False, str(e)
+    def _set_sync_marks(self, **marks):
+        # Whole seconds, like updated_at on disk: the marks are compared with >=, so
+        # records of that second are sent (or pulled) again rather than missed
+        state = self._sync_state.setdefault(self._sync_target(), {})
+        for name, when in marks.items():
+            if when is not None:
+                state[name] = when.strftime("%Y-%m-%d %H:%M:%S")
+        with atomic_file(self.sync_state_file) as f:
+            json.dump(self._sync_state, f)
+
+    def _set_export_watermark(self, when):
+        self._unexported_products.clear()
+        self._unexported_orders.clear()
+        self._oldest_unexported = None
+        self._scanned_target = self._sync_target()
+        self._set_sync_marks(exported_at=when)
+
+    def _queue_export(self, product_codes, order_codes, since):
+        """Adds codes to the export queue; `since` is when the oldest of them changed."""
+        if not product_codes and not order_codes:
+            return
+        self._unexported_products.update(product_codes)
+        self._unexported_orders.update(order_codes)
+        if self._oldest_unexported is None or since < self._oldest_unexported:
+            self._oldest_unexported = since
+        if len(self._unexported_products) + len(self._unexported_orders) > self.max_unexported:
+            # All of them have updated_at >= the export watermark, the next export finds them again
+            self._unexported_products.clear()
+            self._unexported_orders.clear()
+            self._scanned_target = None
+
+    def _unexported(self, full=False):
+        """Products and orders to push: all of them on a full export, else the ones changed since the watermark."""
+        watermark = None if full else self._sync_mark("exported_at")
+        if watermark is None:
+            self._load_archive()
+            return list(self.products), list(self.orders)
+        if self._scanned_target != self._sync_target():
+            # Changes made before a restart (or while exporting elsewhere) only show in updated_at
+            self._load_archive()
+            products = [p for p in self.products
+                        if p.code_prod in self._unexported_products or (p.updated_at and p.updated_at >= watermark)]
+            orders = [o for o in self.orders
+                      if o.code_cmd in self._unexported_orders or (o.updated_at and o.updated_at >= watermark)]
+            return products, orders
+        return ([self._products_by_code[code] for code in self._unexported_products],
+                [self._orders_by_code[code] for code in self._unexported_orders])
+
+    def export_json_to_db(self, chunk_size=None, full=False):
+        """
+        Pushes the records changed since the last successful export to MySQL,
+        in batches and a single transaction. full=True re-sends everything.
+        The rows are built under the manager lock, the upload runs without it.
+        """
+        if self.db_pool is None:
+            return False, "Not connected to database."
+
+        with self._export_lock:
+            with self._lock:
+                started = datetime.datetime.now()
+                products, orders = self._unexported(full)
+                product_rows = [product_row(p) for p in products]
+                order_rows = [order_row(o) for o in orders]
+                oldest = self._oldest_unexported or started
+                # Changes committed during the upload go to the next export
+                self._unexported_products = set()
+                self._unexported_orders = set()
+                self._oldest_unexported = None
+                self._scanned_target = self._sync_target()
+
+            if product_rows or order_rows:
+                try:
+                    # One transaction of upserts: safe to repeat on a fresh connection
+                    self.last_export = self.db_pool.run(
+                        lambda conn: BatchExporter(conn, chunk_size or self.export_chunk_size)
+                        .export_rows(product_rows, order_rows))
+                except Exception as e:
+                    with self._lock:
+                        # Back in the queue for the next attempt
+                        self._queue_export([p.code_prod for p in products], [o.code_cmd for o in orders], oldest)
+                    if not isinstance(e, Error):
+                        raise
+                    return False, str(e)
+
+            with self._lock:
+                self._set_sync_marks(exported_at=started)
+
+        if not product_rows and not order_rows:
+            return True, "Database already up to date."
+        return True, f"Data exported to Database successfully ({self.last_export})."
 
     def import_db_to_json(self):
         """Imports data from MySQL to in-memory/JSON structure."""
-        if not hasattr(self, 'db_conn') or not self.db_conn.is_connected():
+        if self.db_pool is None:
             return False, "Not connected to database."
         
         try:
-            cursor = self.db_conn.cursor(dictionary=True)
-            
-            # Import Products
-            cursor.execute("SELECT * FROM products")
-            db_products = cursor.fetchall()
-            self.products = [] 
-            for row in db_products:
-                p = Product(
-                    row['code_prod'], row['nom_prod'], row['description'],
-                    row['quantite'], float(row['prix_unit']), row['status']
-                )
-                self.products.append(p)
-            
-            # Import Orders
-            cursor.execute("SELECT * FROM orders")
-            db_orders = cursor.fetchall()
-            self.orders = []
-            for row in db_orders:
-                o = Order(row['code_cmd'])
-                lines_data = json.loads(row['details'])
-                o.lines = [OrderLine.from_dict(l) for l in lines_data]
-                
-                # Convert DB strings to Enums
-                try:
-                    o.status = OrderStatus(row['status'])
-                except ValueError:
-                    o.status = OrderStatus.DRAFT # Fallback
-                
-                try:
-                    o.payment_status = PaymentStatus(row['payment_status'])
-                except ValueError:
-                    o.payment_status = PaymentStatus.UNPAID # Fallback
-
-                o.created_at = row['created_at']
-                if isinstance(o.created_at, str):
-                    try:
-                        o.created_at = datetime.datetime.fromisoformat(o.created_at)
-                    except ValueError:
-                        o.created_at = datetime.datetime.now()
-
-                o.updated_at = row['updated_at']
-                if isinstance(o.updated_at, str):
-                    try:
-                        o.updated_at = datetime.datetime.fromisoformat(o.updated_at)
-                    except ValueError:
-                        o.updated_at = o.created_at
-
-                self.orders.append(o)
-
-            self.save_data()
+            started = datetime.datetime.now()
+            def fetch(conn):
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT * FROM products")
+                product_rows = cursor.fetchall()
+                cursor.execute("SELECT * FROM orders")
+                return product_rows, cursor.fetchall()
+
+            product_rows, order_rows = self.db_pool.run(fetch)
+            products = [product_from_row(row) for row in product_rows]
+            orders = [order_from_row(row) for row in order_rows]
+
+            with self._export_lock, self._lock:
+                self.products = products
+                self.orders = orders
+                self._archived_pending = set()
+                self._rebuild_indexes()
+                self._observe_codes()
+                self._seed_activity()
+                self.save_data()
+                # Local data now mirrors the database
+                self._set_export_watermark(started)
+                self._set_sync_marks(products_synced_at=self._latest_sync(product_rows),
+                                     orders_synced_at=self._latest_sync(order_rows))
             return True, "Data imported from Database successfully."
         except Error as e:
             return False, str(e)
         except Exception as e:
             return False, f"Error parsing data: {e}"
 
-    def sync_data(self):
+    def _pull(self, cursor, table, columns, since):
+        """
+        Rows of `table` written to the server since `since` minus sync_overlap
+        (all of them when None), read through the synced_at index.
+        """
+        columns = ", ".join(columns + ("synced_at",))
+        if since is None:
+            cursor.execute(f"SELECT {columns} FROM {table}")
+        else:
+            cursor.execute(f"SELECT {columns} FROM {table} WHERE synced_at >= %s", (since - self.sync_overlap,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def _latest_sync(rows):
+        """Most recent synced_at of pulled rows (the driver may return strings), None if none."""
+        return max(filter(None, (db_date(row.get('synced_at')) for row in rows)), default=None)
+
+    def _is_newer(self, pulled, local, same, queued):
+        """
+        Last writer wins on updated_at; rows without one (older schema) defer to
+        a stamped local record. Stamps are whole seconds, so two writes of the
+        same second tie: the pulled row then wins if it differs (`same` is false)
+        and the local record has no change the database is still missing
+        (`queued` for export, or stamped since the last export when the queue
+        does not cover the restart).
         """
-        Merge rules:
-        1. Local products that match DB ID -> Update Local with DB values (Master).
-           EXCEPTION: We could sum quantities, but let's assume DB is the truth for this step? 
-           User said "automated db setup... rules like new ids or merge qte specifications".
-           Implementation: If exists in DB, update local (including Qty). 
-           BUT user mentioned "merge qte". Let's sum them for 'sync'.
-        2. New IDs in DB -> Add to Local.
-        3. Local IDs not in DB -> Keep (will be exported).
+        if local.updated_at is None:
+            return True
+        if pulled.updated_at is None or pulled.updated_at < local.updated_at:
+            return False
+        if pulled.updated_at > local.updated_at:
+            return True
+        if same or queued:
+            return False
+        if self._scanned_target == self._sync_target():
+            return True
+        watermark = self._sync_mark("exported_at")
+        return watermark is not None and local.updated_at < watermark
+
+    def _merge_product_row(self, row):
+        """Applies a pulled product row, returns the local product if it changed."""
+        pulled = product_from_row(row)
+        local = self._products_by_code.get(pulled.code_prod)
+        if local is None:
+            self.products.append(pulled)
+            self._products_by_code[pulled.code_prod] = pulled
+            self._products_by_name[self._name_key(pulled.nom_prod)] = pulled
+            self.product_ids.observe(pulled.code_prod)
+            return pulled
+        if not self._is_newer(pulled, local, product_row(pulled) == product_row(local),
+                              local.code_prod in self._unexported_products):
+            return None
+        self._rename_product(local, pulled.nom_prod)
+        local.description = pulled.description
+        local.quantite = pulled.quantite
+        local.prix_unit = pulled.prix_unit
+        local.status = pulled.status
+        local.updated_at = pulled.updated_at
+        return local
+
+    def _merge_order_row(self, row):
+        """Applies a pulled order row, returns the local order if it changed."""
+        pulled = order_from_row(row)
+        local = self._orders_by_code.get(pulled.code_cmd)
+        if local is None:
+            self.orders.append(pulled)
+            self._orders_by_code[pulled.code_cmd] = pulled
+            self.order_ids.observe(pulled.code_cmd)
+            return pulled
+        if not self._is_newer(pulled, local, order_row(pulled) == order_row(local),
+                              local.code_cmd in self._unexported_orders):
+            return None
+        self.stats.lines_changing(local)
+        local.lines = pulled.lines
+        local.status = pulled.status
+        local.payment_status = pulled.payment_status
+        local.delivery_status = pulled.delivery_status
+        local.created_at = pulled.created_at
+        local.updated_at = pulled.updated_at
+        local.paid_at = pulled.paid_at
+        local.delivered_at = pulled.delivered_at
+        local.paid_amount = pulled.paid_amount
+        return local
+
+    def sync_data(self, full=False):
+        """
+        Pulls the products and orders changed in MySQL since the last sync,
+        then pushes the local changes (export_json_to_db).
+
+        Only rows the server wrote since the latest synced_at already pulled
+        (less sync_overlap) are read, through the synced_at indexes, so a sync
+        costs in proportion to what changed; full=True reads both tables again.
+        A pulled row replaces the local record when its updated_at is more
+        recent (last writer wins), so local changes not exported yet are kept
+        and pushed, and rows read again change nothing. New codes are added.
         """
-        if not hasattr(self, 'db_conn') or not self.db_conn.is_connected():
+        if self.db_pool is None:
             return False, "Not connected to database."
-        
+
         try:
-            cursor = self.db_conn.cursor(dictionary=True)
-            
-            # --- SYNC PRODUCTS ---
-            cursor.execute("SELECT * FROM products")
-            db_prods = {row['code_prod']: row for row in cursor.fetchall()}
-            
-            local_prods_map = {p.code_prod: p for p in self.products}
-            
-            for code, row in db_prods.items():
-                if code in local_prods_map:
-                    local_p = local_prods_map[code]
-                    # Merge Logic: DB is Master for attributes to avoid infinite growth on repeated sync.
-                    # "Merge Qty" interpreted as: if duplicates existed in source, they are summed (handled by DB aggregation if any, or previous imports).
-                    # For Client-DB sync: Update local with DB value.
-                    local_p.quantite = row['quantite'] 
-                    # Update other fields from DB
-                    local_p.nom_prod = row['nom_prod']
-                    local_p.prix_unit = float(row['prix_unit'])
-                else:
-                    # New from DB
-                    p = Product(
-                        row['code_prod'], row['nom_prod'], row['description'],
-                        row['quantite'], float(row['prix_unit']), row['status']
-                    )
-                    self.products.append(p)
-            
-            self.save_data()
-            # Push back everything to DB
-            self.export_json_to_db()
-            
-            return True, "Data synchronized (Quantities Merged)."
+            # Read before taking the manager lock: edits are not held up by the network
+            products_since = None if full else self._sync_mark("products_synced_at")
+            orders_since = None if full else self._sync_mark("orders_synced_at")
+            def pull(conn):
+                cursor = conn.cursor(dictionary=True)
+                return (self._pull(cursor, "products", PRODUCT_COLUMNS, products_since),
+                        self._pull(cursor, "orders", ORDER_COLUMNS, orders_since))
+
+            product_rows, order_rows = self.db_pool.run(pull)
         except Error as e:
             return False, str(e)
 
+        # After any export in flight: it took its records off the queue before uploading them
+        with self._export_lock, self._lock:
+            products = [p for p in map(self._merge_product_row, product_rows) if p is not None]
+            if any(row['code_cmd'] in self._archived_pending for row in order_rows):
+                self._load_archive()
+            orders = [o for o in map(self._merge_order_row, order_rows) if o is not None]
+
+            # Persisted like any change, but not queued for export: the database already has them
+            self._reindex(products, orders)
+            for p in products:
+                self._dirty_products[p.code_prod] = p
+            for o in orders:
+                self._dirty_orders[o.code_cmd] = o
+            self.flush()
+            self._set_sync_marks(products_synced_at=self._latest_sync(product_rows),
+                                 orders_synced_at=self._latest_sync(order_rows))
+
+        success, msg = self.export_json_to_db()
+        if not success:
+            return False, msg
+        return True, f"Data synchronized ({len(products)} products, {len(orders)} orders pulled)."
@@ -1,4 +1,5 @@
 import datetime
+from collections.abc import Sequence
 from enum import Enum
 
 class OrderStatus(Enum):
@@ -25,13 +26,29 @@ class ProductStatus(Enum):
     ARCHIVED = "ARCHIVED"
 
 class Product:
-    def __init__(self, code_prod, nom_prod, description, quantite, prix_unit, status=ProductStatus.ACTIVE):
+    # __slots__ instead of a per-instance __dict__: catalogues and order
+    # histories keep millions of these objects in memory
+    __slots__ = ("code_prod", "nom_prod", "description", "quantite", "prix_unit", "status", "seuil_alerte",
+                 "updated_at")
+
+    def __init__(self, code_prod, nom_prod, description, quantite, prix_unit, status=ProductStatus.ACTIVE,
+                 seuil_alerte=None, updated_at=None):
         self.code_prod = code_prod
         self.nom_prod = nom_prod
         self.description = description
         self.quantite = quantite
         self.prix_unit = prix_unit
         self.status = status if isinstance(status, ProductStatus) else ProductStatus(status)
+        # Reorder threshold of this product, None = the manager's low-stock threshold
+        self.seuil_alerte = seuil_alerte
+        # Last local change, stamped by StockManager; drives the delta export to MySQL
+        if isinstance(updated_at, str):
+            try:
+                updated_at = datetime.datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                # Unreadable stamp: treated as unknown, a full export or sync still carries the product
+                updated_at = None
+        self.updated_at = updated_at
 
     def to_dict(self):
         return {
@@ -40,7 +57,9 @@ class Product:
             "description": self.description,
             "quantite": self.quantite,
             "prix_unit": self.prix_unit,
-            "status": self.status.value
+            "status": self.status.value,
+            "seuil_alerte": self.seuil_alerte,
+            "updated_at": self.updated_at.strftime("%Y-%m-%d %H:%M:%S") if self.updated_at else None
         }
 
     @classmethod
@@ -51,7 +70,9 @@ class Product:
             data["description"],
             data["quantite"],
             data["prix_unit"],
-            data.get("status", "ACTIVE")
+            data.get("status", "ACTIVE"),
+            data.get("seuil_alerte"),
+            data.get("updated_at")
         )
 
     def __str__(self):
@@ -59,14 +80,38 @@ class Product:
         return f"[{self.code_prod}] {self.nom_prod} - {self.quantite} en stock - {self.prix_unit}€{status_str}"
 
 class OrderLine:
+    # _order: owning Order, told to drop its cached total when this line changes
+    __slots__ = ("code_prod", "_quantity", "_price_at_order_time", "_order")
+
     def __init__(self, code_prod, quantity, price_at_order_time):
+        self._order = None
         self.code_prod = code_prod
-        self.quantity = quantity
-        self.price_at_order_time = price_at_order_time
+        self._quantity = quantity
+        self._price_at_order_time = price_at_order_time
+
+    @property
+    def quantity(self):
+        return self._quantity
+
+    @quantity.setter
+    def quantity(self, value):
+        self._quantity = value
+        if self._order is not None:
+            self._order._invalidate_total()
+
+    @property
+    def price_at_order_time(self):
+        return self._price_at_order_time
+
+    @price_at_order_time.setter
+    def price_at_order_time(self, value):
+        self._price_at_order_time = value
+        if self._order is not None:
+            self._order._invalidate_total()
 
     @property
     def total(self):
-        return self.quantity * self.price_at_order_time
+        return self._quantity * self._price_at_order_time
 
     def to_dict(self):
         return {
@@ -83,7 +128,31 @@ class OrderLine:
             data["price_at_order_time"]
         )
 
+class LineView(Sequence):
+    """Read-only window on an order's line list: no copy, follows add_line."""
+    __slots__ = ("_lines",)
+
+    def __init__(self, lines):
+        self._lines = lines
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._lines[index])
+        return self._lines[index]
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def __repr__(self):
+        return f"LineView({self._lines!r})"
+
 class Order:
+    __slots__ = ("code_cmd", "_lines", "_lines_view", "_total", "status", "payment_status", "delivery_status",
+                 "created_at", "updated_at", "paid_at", "delivered_at", "_paid_amount")
+
     def __init__(self, code_cmd, lines=None, status=OrderStatus.DRAFT, 
                  payment_status=PaymentStatus.UNPAID, delivery_status=DeliveryStatus.NOT_SHIPPED,
                  created_at=None, paid_at=None, delivered_at=None, paid_amount=0.0, updated_at=None):
@@ -110,9 +179,40 @@ class Order:
                 return None
         return date_obj
 
+    @property
+    def lines(self):
+        # Read-only view: changes go through the setter or add_line so the cached total stays right
+        return self._lines_view
+
+    @lines.setter
+    def lines(self, lines):
+        self._lines = list(lines)
+        self._lines_view = LineView(self._lines)
+        for line in self._lines:
+            line._order = self
+        self._total = None
+
+    def add_line(self, code_prod, quantity, price_at_order_time):
+        """Adds a line, merging it into the existing line for the same product."""
+        for line in self._lines:
+            if line.code_prod == code_prod:
+                line.quantity += quantity
+                return line
+        line = OrderLine(code_prod, quantity, price_at_order_time)
+        line._order = self
+        self._lines.append(line)
+        self._total = None
+        return line
+
+    def _invalidate_total(self):
+        self._total = None
+
     @property
     def total_amount(self):
-        return sum(line.total for line in self.lines)
+        # Cached, reset whenever a line is added, merged or replaced
+        if self._total is None:
+            self._total = sum(line.total for line in self._lines)
+        return self._total
 
     @property
     def paid_amount(self):
@@ -152,4 +252,4 @@ class Order:
         )
 
     def __str__(self):
-        return f"CMD#{self.code_cmd} [{self.status.value}] - {len(self.lines)} lines - Total: {self.total_amount:.2f}€"
+        return f"CMD#{self.code_cmd} [{self.status.value}] - {len(self._lines)} lines - Total: {self.total_amount:.2f}€"
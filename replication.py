@@ -0,0 +1,81 @@
+"""
+Background replication of local changes to the MySQL mirror (auto-sync).
+
+StockManager's unexported code sets are the queue: a change only adds its
+code there, so repeated edits of a record coalesce, and wakes the worker,
+which pushes everything pending in one batch off the calling thread.
+Failed pushes are retried with exponential backoff. Unsent changes survive
+a restart through the export watermark, which only moves on success.
+    worker = ReplicationWorker(manager.export_json_to_db)
+    worker.notify()
+"""
+import threading
+import time
+
+
+class ReplicationWorker:
+    def __init__(self, push, delay=0.5, backoff=1.0, max_backoff=60.0):
+        """
+        push: callable returning (ok, message) that exports everything pending.
+        delay: seconds to wait after a wake-up so the changes made meanwhile
+        go out in the same batch.
+        """
+        self.push = push
+        self.delay = delay
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.failures = 0 # consecutive failed pushes
+        self.last_error = None
+        self.last_push = None # time.time() of the last successful push
+        self.pushes = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self):
+        """Signals pending changes, starting the thread on first use."""
+        with self._start_lock:
+            if not self.running:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="replication", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        """Stops the thread; a push in progress gets `timeout` seconds to finish."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def retry_in(self):
+        """Seconds to wait after the current run of failures."""
+        return min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            if self._stop.wait(self.delay):
+                return
+            # Cleared before the push: a change committed during it wakes us again
+            self._wake.clear()
+            try:
+                ok, msg = self.push()
+            except Exception as e:
+                ok, msg = False, str(e)
+            if ok:
+                self.failures = 0
+                self.last_error = None
+                self.last_push = time.time()
+                self.pushes += 1
+                continue
+            self.failures += 1
+            self.last_error = msg
+            self._wake.set()
+            if self._stop.wait(self.retry_in()):
+                return
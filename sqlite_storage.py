@@ -0,0 +1,180 @@
+"""
+Embedded SQLite backend for StockManager: no server, indexed tables, WAL
+journaling and one transaction per flushed mutation.
+    manager = StockManager(storage=SqliteStorage("stock.db"))
+"""
+import datetime
+import sqlite3
+from models import Product, Order, OrderLine, OrderStatus, PaymentStatus
+from storage import SnapshotStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    code_prod INTEGER PRIMARY KEY,
+    nom_prod TEXT NOT NULL,
+    description TEXT,
+    quantite INTEGER,
+    prix_unit REAL,
+    status TEXT,
+    seuil_alerte INTEGER,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    code_cmd INTEGER PRIMARY KEY,
+    status TEXT,
+    payment_status TEXT,
+    delivery_status TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    paid_at TEXT,
+    delivered_at TEXT,
+    paid_amount REAL
+);
+CREATE TABLE IF NOT EXISTS order_lines (
+    code_cmd INTEGER NOT NULL REFERENCES orders(code_cmd),
+    line_no INTEGER NOT NULL,
+    code_prod INTEGER,
+    quantity INTEGER,
+    price REAL,
+    PRIMARY KEY (code_cmd, line_no)
+);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_payment_status ON orders(payment_status);
+CREATE INDEX IF NOT EXISTS idx_order_lines_code_prod ON order_lines(code_prod);
+"""
+
+# Columns added after the first release: name -> type, added to older files on open
+MIGRATIONS = {
+    "products": {"seuil_alerte": "INTEGER", "updated_at": "TEXT"},
+}
+
+PRODUCT_COLUMNS = "code_prod, nom_prod, description, quantite, prix_unit, status, seuil_alerte, updated_at"
+ORDER_COLUMNS = "code_cmd, status, payment_status, delivery_status, created_at, updated_at, paid_at, delivered_at, paid_amount"
+
+
+def _format_date(value):
+    return value.isoformat(sep=' ', timespec='seconds') if value else None
+
+
+def _parse_date(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+class SqliteStorage(SnapshotStorage):
+    incremental = True
+    aggregates = True
+
+    def __init__(self, path="stock.db"):
+        self.path = path
+        # Flushes may run on the debounce timer thread, StockManager serializes access
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        with self.conn:
+            for table, columns in MIGRATIONS.items():
+                existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                for name, sql_type in columns.items():
+                    if name not in existing:
+                        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+
+    # --- Loading ---
+    def load(self, lazy_archive=False):
+        products = [
+            Product(*row)
+            for row in self.conn.execute(
+                f"SELECT {PRODUCT_COLUMNS} FROM products ORDER BY code_prod")
+        ]
+        if lazy_archive:
+            orders = self._select_orders("WHERE o.status != ?", (OrderStatus.ARCHIVED.value,))
+            archived = {row[0] for row in self.conn.execute(
+                "SELECT code_cmd FROM orders WHERE status = ?", (OrderStatus.ARCHIVED.value,))}
+        else:
+            orders = self._select_orders()
+            archived = set()
+        return products, orders, archived
+
+    def load_archived(self, codes):
+        if not codes:
+            return []
+        orders = self._select_orders("WHERE o.status = ?", (OrderStatus.ARCHIVED.value,))
+        return [o for o in orders if o.code_cmd in codes]
+
+    def _select_orders(self, where="", params=()):
+        lines = {}
+        for code_cmd, code_prod, quantity, price in self.conn.execute(
+                f"SELECT l.code_cmd, l.code_prod, l.quantity, l.price FROM order_lines l "
+                f"JOIN orders o ON o.code_cmd = l.code_cmd {where} ORDER BY l.code_cmd, l.line_no", params):
+            lines.setdefault(code_cmd, []).append(OrderLine(code_prod, quantity, price))
+
+        orders = []
+        for code, status, payment, delivery, created, updated, paid, delivered, paid_amount in self.conn.execute(
+                f"SELECT {ORDER_COLUMNS} FROM orders o {where} ORDER BY o.code_cmd", params):
+            orders.append(Order(
+                code, lines.get(code, []), status, payment, delivery,
+                _parse_date(created), _parse_date(paid), _parse_date(delivered),
+                paid_amount, _parse_date(updated)
+            ))
+        return orders
+
+    # --- Writing ---
+    def _upsert(self, products, orders):
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO products ({PRODUCT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(p.code_prod, p.nom_prod, p.description, p.quantite, p.prix_unit, p.status.value, p.seuil_alerte,
+              _format_date(p.updated_at))
+             for p in products]
+        )
+        orders = list(orders)
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO orders ({ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(o.code_cmd, o.status.value, o.payment_status.value, o.delivery_status.value,
+              _format_date(o.created_at), _format_date(o.updated_at),
+              _format_date(o.paid_at), _format_date(o.delivered_at), o.paid_amount) for o in orders]
+        )
+        self.conn.executemany("DELETE FROM order_lines WHERE code_cmd = ?", [(o.code_cmd,) for o in orders])
+        self.conn.executemany(
+            "INSERT INTO order_lines (code_cmd, line_no, code_prod, quantity, price) VALUES (?, ?, ?, ?, ?)",
+            [(o.code_cmd, i, l.code_prod, l.quantity, l.price_at_order_time)
+             for o in orders for i, l in enumerate(o.lines)]
+        )
+
+    def write(self, products=(), orders=()):
+        """Upserts the changed records in a single transaction."""
+        with self.conn:
+            self._upsert(products, orders)
+
+    def save(self, products, orders, archived_codes=()):
+        """Replaces the whole content, keeping the archived orders that were not paged in."""
+        with self.conn:
+            self.conn.execute("DELETE FROM products")
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_orders (code_cmd INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep_orders")
+            self.conn.executemany("INSERT INTO keep_orders VALUES (?)", [(code,) for code in archived_codes])
+            self.conn.execute("DELETE FROM order_lines WHERE code_cmd NOT IN (SELECT code_cmd FROM keep_orders)")
+            self.conn.execute("DELETE FROM orders WHERE code_cmd NOT IN (SELECT code_cmd FROM keep_orders)")
+            self._upsert(products, orders)
+
+    def close(self):
+        self.conn.close()
+
+    # --- Dashboard aggregates ---
+    def revenue_by_product(self, k=None):
+        """Same result as StockManager.get_revenue_by_product, computed by SQLite."""
+        rows = self.conn.execute("""
+            SELECT l.code_prod, p.nom_prod, SUM(l.quantity * l.price) AS revenue
+            FROM order_lines l
+            JOIN orders o ON o.code_cmd = l.code_cmd
+            LEFT JOIN products p ON p.code_prod = l.code_prod
+            WHERE o.payment_status = ?
+            GROUP BY l.code_prod
+            ORDER BY revenue DESC
+            LIMIT ?
+        """, (PaymentStatus.PAID.value, -1 if k is None else k))
+        return [(nom if nom is not None else f"Unknown ({code})", revenue) for code, nom, revenue in rows]
+
+    def order_status_distribution(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM orders GROUP BY status"))
@@ -0,0 +1,240 @@
+"""
+Dashboard aggregates maintained incrementally by StockManager.
+
+Each order's contribution to the aggregates is remembered, so a change to
+an order is applied as "remove the old contribution, add the new one" and
+the dashboard never rescans the order history.
+"""
+import bisect
+import datetime
+import heapq
+from models import OrderStatus, PaymentStatus, ProductStatus
+
+_INACTIVE = (OrderStatus.CANCELLED, OrderStatus.ARCHIVED)
+
+
+def _bump(counter, key, delta):
+    count = counter.get(key, 0) + delta
+    if count:
+        counter[key] = count
+    else:
+        counter.pop(key, None)
+
+
+def _accumulate(table, key, amount, sign):
+    # table[key] = [total, number of contributions]; the key disappears with its last contribution
+    entry = table.get(key)
+    if entry is None:
+        entry = table[key] = [0, 0]
+    entry[0] += sign * amount
+    entry[1] += sign
+    if entry[1] == 0:
+        del table[key]
+
+
+def top_by_label(totals, label, k=None):
+    """
+    Ranks (code_prod, value) pairs by value, products reported by name (codes
+    resolving to the same label are merged). With k, only the k best are kept
+    through a heap instead of sorting the whole catalogue; ties keep their
+    first-seen order either way.
+    """
+    merged = {}
+    for code, value in totals:
+        name = label(code)
+        merged[name] = merged.get(name, 0) + value
+    if k is None:
+        return sorted(merged.items(), key=lambda item: item[1], reverse=True)
+    return heapq.nlargest(k, merged.items(), key=lambda item: item[1])
+
+
+def _bucket_start(day, granularity):
+    """First day (ordinal) of the day/week/month/quarter bucket containing `day`."""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - datetime.date.fromordinal(day).weekday()
+    d = datetime.date.fromordinal(day)
+    if granularity == "month":
+        return d.replace(day=1).toordinal()
+    if granularity == "quarter":
+        return d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1).toordinal()
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def _next_bucket(start, granularity):
+    if granularity == "day":
+        return start + 1
+    if granularity == "week":
+        return start + 7
+    d = datetime.date.fromordinal(start)
+    months = d.year * 12 + d.month - 1 + (1 if granularity == "month" else 3)
+    return datetime.date(months // 12, months % 12 + 1, 1).toordinal()
+
+
+def _bucket_label(start, granularity):
+    d = datetime.date.fromordinal(start)
+    if granularity == "month":
+        return d.strftime("%Y-%m")
+    if granularity == "quarter":
+        return f"{d.year}-Q{(d.month - 1) // 3 + 1}"
+    return d.isoformat() # day, or the Monday of a week
+
+
+class RevenueIndex:
+    """
+    Paid revenue per day, kept sorted by day with prefix sums, so the revenue
+    of any date range costs O(log n) and a rollup O(buckets). Prefix sums are
+    recomputed lazily from the first changed day; payments almost always land
+    on the latest day, which keeps that cheap.
+    """
+
+    def __init__(self):
+        self._days = []     # sorted day ordinals having paid revenue
+        self._values = {}   # day -> [revenue, refs]
+        self._prefix = [0.0]
+        self._valid = 0     # self._prefix is correct for self._days[:self._valid]
+
+    def add(self, day, amount, sign):
+        if day not in self._values:
+            bisect.insort(self._days, day)
+        _accumulate(self._values, day, amount, sign)
+        pos = bisect.bisect_left(self._days, day)
+        if day not in self._values:
+            del self._days[pos]
+        self._valid = min(self._valid, pos)
+
+    def _ensure_prefix(self):
+        if self._valid == len(self._days) and len(self._prefix) == len(self._days) + 1:
+            return
+        del self._prefix[self._valid + 1:]
+        total = self._prefix[-1]
+        for day in self._days[self._valid:]:
+            total += self._values[day][0]
+            self._prefix.append(total)
+        self._valid = len(self._days)
+
+    def _range(self, start, end):
+        # Positions of the days in [start, end] (ordinals, None = unbounded)
+        lo = 0 if start is None else bisect.bisect_left(self._days, start)
+        hi = len(self._days) if end is None else bisect.bisect_right(self._days, end)
+        return lo, hi
+
+    def total(self, start=None, end=None):
+        """Revenue of the days in [start, end], both ordinals and inclusive."""
+        lo, hi = self._range(start, end)
+        if lo >= hi:
+            return 0
+        self._ensure_prefix()
+        return self._prefix[hi] - self._prefix[lo]
+
+    def series(self, granularity="day", start=None, end=None):
+        """[(label, revenue)] for the non-empty buckets overlapping [start, end]."""
+        lo, hi = self._range(start, end)
+        if granularity == "day":
+            # Exact per-day values, no prefix difference involved
+            return [(datetime.date.fromordinal(d).isoformat(), self._values[d][0]) for d in self._days[lo:hi]]
+        self._ensure_prefix()
+        result = []
+        while lo < hi:
+            bucket = _bucket_start(self._days[lo], granularity)
+            nxt = min(hi, bisect.bisect_left(self._days, _next_bucket(bucket, granularity), lo, hi))
+            result.append((_bucket_label(bucket, granularity), self._prefix[nxt] - self._prefix[lo]))
+            lo = nxt
+        return result
+
+
+class DashboardStats:
+    def __init__(self):
+        self.rebuild([], [])
+
+    def rebuild(self, products, orders):
+        self._orders = {}
+        self._old_lines = {} # code_cmd -> lines before an edit, see lines_changing
+        self._products = {}
+        self.active_orders = 0
+        self.active_revenue = 0.0
+        self.active_products = 0
+        self.payment_counts = {}  # orders not cancelled/archived; status counts: indexes.OrderPartitions
+        self.demand = {}          # code_prod -> [quantity, refs], orders not cancelled/archived
+        self.revenue_by_code = {} # code_prod -> [revenue, refs], paid orders
+        self.revenue_index = RevenueIndex() # paid orders, by payment day
+        for p in products:
+            self.apply_product(p)
+        for o in orders:
+            self.apply_order(o)
+
+    # --- Updates ---
+    def lines_changing(self, order):
+        """
+        Call before changing the lines of an order already applied: the
+        contributions keep no copy of the lines, the old ones are needed to
+        take back their per-product amounts.
+        """
+        if order.code_cmd in self._orders and order.code_cmd not in self._old_lines:
+            self._old_lines[order.code_cmd] = self._line_values(order)
+
+    @staticmethod
+    def _line_values(order):
+        return [(l.code_prod, l.quantity, l.total) for l in order.lines]
+
+    def apply_order(self, order):
+        old = self._orders.get(order.code_cmd)
+        if old is not None:
+            old_lines = self._old_lines.pop(order.code_cmd, None)
+            self._apply(old, self._line_values(order) if old_lines is None else old_lines, -1)
+        new = self._contribution(order)
+        self._orders[order.code_cmd] = new
+        self._apply(new, self._line_values(order), 1)
+
+    @staticmethod
+    def _contribution(order):
+        # No per-line data: one small tuple per order, lines are read from the order
+        paid = order.payment_status == PaymentStatus.PAID
+        day = order.paid_at.toordinal() if paid and order.paid_at else None
+        return (order.payment_status.value, order.status not in _INACTIVE,
+                paid, order.total_amount, day)
+
+    def _apply(self, contribution, lines, sign):
+        payment, active, paid, total, day = contribution
+        if not (active or paid):
+            return
+        if active:
+            self.active_orders += sign
+            _bump(self.payment_counts, payment, sign)
+            if paid:
+                self.active_revenue += sign * total
+            for code, qty, _ in lines:
+                _accumulate(self.demand, code, qty, sign)
+        if paid:
+            for code, _, line_total in lines:
+                _accumulate(self.revenue_by_code, code, line_total, sign)
+            if day:
+                self.revenue_index.add(day, total, sign)
+
+    def apply_product(self, product):
+        # Stock levels live in indexes.StockLevelIndex
+        active = product.status == ProductStatus.ACTIVE
+        self.active_products += active - self._products.get(product.code_prod, False)
+        self._products[product.code_prod] = active
+
+    # --- Queries, O(size of the output) ---
+    def kpis(self):
+        return {
+            "total_revenue": self.active_revenue,
+            "active_orders": self.active_orders,
+            "active_products": self.active_products
+        }
+
+    @staticmethod
+    def _by_label(table, label, k=None):
+        return top_by_label(((code, value) for code, (value, _) in table.items()), label, k)
+
+    def most_ordered(self, label, k=None):
+        return self._by_label(self.demand, label, k)
+
+    def revenue_by_product(self, label, k=None):
+        return self._by_label(self.revenue_by_code, label, k)
+
+    def revenue_over_time(self, granularity="day", start=None, end=None):
+        return self.revenue_index.series(granularity, start, end)
@@ -0,0 +1,558 @@
+"""
+Persistence helpers and storage backends for StockManager.
+
+A backend loads and saves full snapshots of the products and orders:
+    load(lazy_archive)            -> (products, orders, archived_codes)
+    load_archived(codes)          -> orders skipped by a lazy load
+    save(products, orders, archived_codes)
+archived_codes are archived orders left on disk by a lazy load; save() must
+carry them over into the new snapshot. Backends with `incremental = True`
+also persist single changes through write(products, orders), and the
+journal is not used for them.
+"""
+import datetime
+import heapq
+import itertools
+import json
+import os
+import struct
+import sys
+from collections import deque
+from contextlib import contextmanager
+from models import Product, Order, OrderLine, OrderStatus, PaymentStatus, DeliveryStatus, ProductStatus
+
+
+def backup_paths(path, backups):
+    return [f"{path}.bak.{i}" for i in range(1, backups + 1)]
+
+
+def _fsync_dir(path):
+    # Makes the rename itself durable (not supported on Windows)
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_file(path, backups=0, binary=False):
+    """
+    Yields a file that replaces `path` only once it is completely written
+    and fsynced. The previous version is rotated into path.bak.1..N.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with (open(tmp_path, 'wb') if binary else open(tmp_path, 'w', encoding='utf-8')) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if backups and os.path.exists(path):
+        olds = backup_paths(path, backups)
+        for older, newer in zip(reversed(olds[1:]), reversed(olds[:-1])):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        os.replace(path, olds[0])
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def write_snapshot(path, records, backups=0):
+    """
+    Atomically writes a JSON array of records, one compact record per line.
+    Records are encoded one by one so the whole file never sits in memory.
+    """
+    with atomic_file(path, backups) as f:
+        f.write("[")
+        sep = "\n"
+        for record in records:
+            f.write(sep)
+            f.write(json.dumps(record, separators=(',', ':')))
+            sep = ",\n"
+        f.write("\n]\n")
+
+
+def read_snapshot(path, backups=0):
+    """
+    Loads a JSON snapshot, falling back to the rotated backups when the
+    file is missing or truncated. Returns None if nothing could be read.
+    """
+    for candidate in [path] + backup_paths(path, backups):
+        if not os.path.exists(candidate):
+            continue
+        try:
+            with open(candidate, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return None
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Streams the elements of a top-level JSON array one at a time, so a large
+    snapshot is never decoded as a whole. Raises json.JSONDecodeError if the
+    file is not a complete array.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos = f.read(chunk_size), 0
+        eof = not buf
+        started = False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and not started:
+                if buf[pos] != "[":
+                    raise json.JSONDecodeError("Expecting '['", buf, pos)
+                started = True
+                pos += 1
+                continue
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            if pos < len(buf):
+                try:
+                    item, pos = decoder.raw_decode(buf, pos)
+                    yield item
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            # Element cut by the chunk boundary (or buffer exhausted): read more
+            more = f.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+
+
+class Journal:
+    """
+    Append-only log of product/order upserts, one JSON line per flush holding
+    every record it wrote, so a mutation touching stock and an order is
+    replayed whole or not at all. Lines are replayed over the last snapshot
+    on startup and the file is truncated every time a full snapshot is
+    written (compaction).
+    Appends are flushed to the OS, not fsynced: like the SQLite backend
+    (synchronous=NORMAL), a process crash loses at most the torn last line,
+    an OS crash or power loss can lose the lines since the last compaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0 # Records written since the last compaction
+        self._file = None
+
+    def append(self, products=(), orders=()):
+        products = [p.to_dict() for p in products]
+        orders = [o.to_dict() for o in orders]
+        if not products and not orders:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        # One line per flush: a torn write can only damage the last one
+        self._file.write(json.dumps({"products": products, "orders": orders}) + "\n")
+        self._file.flush()
+        self.count += len(products) + len(orders)
+
+    @staticmethod
+    def _entry(record):
+        if "products" in record or "orders" in record:
+            return record.get("products", []), record.get("orders", [])
+        # One record per line, written before the journal grouped them by flush
+        kind, data = next(iter(record.items()))
+        if kind == "product":
+            return [data], []
+        if kind == "order":
+            return [], [data]
+        raise ValueError(kind)
+
+    def replay(self):
+        """
+        Yields (product dicts, order dicts), one pair per journal line in write
+        order. A torn or corrupt tail is cut off so later appends stay readable.
+        """
+        self.count = 0
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    products, orders = self._entry(json.loads(raw))
+                except (ValueError, AttributeError, StopIteration):
+                    break
+                valid_size += len(raw)
+                self.count += len(products) + len(orders)
+                yield products, orders
+        if valid_size < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def truncate(self):
+        self.close()
+        if os.path.exists(self.path):
+            open(self.path, 'w').close()
+        self.count = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ActivityLog:
+    """
+    Bounded, time-ordered feed of dashboard events, newest last in memory.
+    Only the last `capacity` events are kept. New events are appended to a
+    JSON-lines file on flush(); the file is rewritten with the kept events
+    once it holds twice the capacity. Not thread-safe: StockManager only
+    touches it under its lock.
+    """
+
+    def __init__(self, path, capacity=1000):
+        self.path = path
+        self.capacity = capacity
+        self.events = deque(maxlen=capacity) # (timestamp, type, code_cmd, amount)
+        self._pending = []
+        self._lines = 0 # Lines currently in the file
+
+    def load(self):
+        """Reads the file back. Returns False when there is none yet (the caller seeds the log)."""
+        self.events.clear()
+        self._pending = []
+        self._lines = 0
+        if not os.path.exists(self.path):
+            return False
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw)
+                    event = (datetime.datetime.fromisoformat(record["timestamp"]), record["type"],
+                             record["code_cmd"], record["amount"])
+                except (ValueError, KeyError, TypeError):
+                    break
+                valid_size += len(raw)
+                self._lines += 1
+                self.events.append(event)
+        if valid_size < os.path.getsize(self.path):
+            # Torn tail, same treatment as the journal
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        return True
+
+    def seed(self, events):
+        """Replaces the log with the most recent of `events`, in any order."""
+        latest = heapq.nlargest(self.capacity, events, key=lambda event: event[0])
+        self.events.clear()
+        self.events.extend(reversed(latest))
+        self.compact()
+
+    def record(self, timestamp, kind, code_cmd, amount):
+        event = (timestamp, kind, code_cmd, amount)
+        self.events.append(event)
+        self._pending.append(event)
+
+    def page(self, offset=0, limit=10):
+        """Events newest first, skipping the `offset` most recent: O(offset + limit)."""
+        return list(itertools.islice(reversed(self.events), offset, offset + limit))
+
+    @staticmethod
+    def _dumps(event):
+        timestamp, kind, code_cmd, amount = event
+        return json.dumps({"timestamp": timestamp.isoformat(), "type": kind,
+                           "code_cmd": code_cmd, "amount": amount}) + "\n"
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self._lines + len(self._pending) > 2 * self.capacity:
+            self.compact()
+            return
+        pending, self._pending = self._pending, []
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(self._dumps(event) for event in pending))
+        self._lines += len(pending)
+
+    def compact(self):
+        with atomic_file(self.path) as f:
+            f.write("".join(self._dumps(event) for event in self.events))
+        self._lines = len(self.events)
+        self._pending = []
+
+
+class SnapshotStorage:
+    """Defaults shared by the storage backends."""
+    incremental = False
+    # True when the backend answers the dashboard aggregates itself (see SqliteStorage)
+    aggregates = False
+
+    def close(self):
+        pass
+
+
+class JsonStorage(SnapshotStorage):
+    """products.json / orders.json snapshots, the historical format."""
+
+    def __init__(self, products_file="products.json", orders_file="orders.json", backups=1):
+        self.products_file = products_file
+        self.orders_file = orders_file
+        self.backups = backups
+        self._archive_source = orders_file
+
+    def load(self, lazy_archive=False):
+        # Products (a truncated snapshot falls back to its backup)
+        products = []
+        data = read_snapshot(self.products_file, self.backups)
+        if data is not None:
+            try:
+                products = [Product.from_dict(item) for item in data]
+            except (KeyError, TypeError):
+                products = []
+
+        # Orders are streamed, the file can hold millions of them
+        for path in [self.orders_file] + backup_paths(self.orders_file, self.backups):
+            if not os.path.exists(path):
+                continue
+            try:
+                orders, archived = self._stream_orders(path, lazy_archive)
+                self._archive_source = path
+                return products, orders, archived
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+        return products, [], set()
+
+    def _stream_orders(self, path, lazy_archive):
+        orders, archived = [], set()
+        for item in iter_json_array(path):
+            try:
+                if lazy_archive and item.get("status") == OrderStatus.ARCHIVED.value:
+                    archived.add(item["code_cmd"])
+                else:
+                    orders.append(Order.from_dict(item))
+            except Exception:
+                # Skip malformed/old version orders to avoid crash
+                continue
+        return orders, archived
+
+    def _archived_records(self, codes):
+        if not codes:
+            return
+        for item in iter_json_array(self._archive_source):
+            if item.get("code_cmd") in codes:
+                yield item
+
+    def load_archived(self, codes):
+        orders = []
+        for item in self._archived_records(codes):
+            try:
+                orders.append(Order.from_dict(item))
+            except Exception:
+                continue
+        return orders
+
+    def save(self, products, orders, archived_codes=()):
+        write_snapshot(self.products_file, (p.to_dict() for p in products), self.backups)
+        # Archived orders not paged in yet are copied over from the previous snapshot
+        records = itertools.chain((o.to_dict() for o in orders), self._archived_records(archived_codes))
+        write_snapshot(self.orders_file, records, self.backups)
+        self._archive_source = self.orders_file
+
+
+# --- Binary snapshot format ---
+# Little-endian, columnar:
+#   header    magic, version, n_products, n_orders, n_lines
+#   products  fixed table (code, quantite, prix_unit, status, seuil_alerte, updated_at) +
+#             two NUL-joined UTF-8 blobs for the names and descriptions
+#   orders    fixed table (code, 3 status indexes, 4 timestamps, paid_amount, n_lines)
+#   lines     fixed table (code_prod, quantity, price) in order sequence
+# Timestamps are whole seconds since 1970-01-01 (naive, like the JSON
+# format), -1 standing for None; so does a seuil_alerte of -1.
+# Version 1 (no seuil_alerte) and 2 (no updated_at) files are still read.
+
+_MAGIC = b"STKB"
+_VERSION = 3
+_HEADER = struct.Struct("<4sHIII")
+_PRODUCT_FORMATS = {1: struct.Struct("<qqdB"), 2: struct.Struct("<qqdBq"), 3: struct.Struct("<qqdBqq")}
+_PRODUCT = _PRODUCT_FORMATS[_VERSION]
+_ORDER = struct.Struct("<qBBBqqqqdI")
+_LINE = struct.Struct("<qqd")
+_BLOB_LEN = struct.Struct("<I")
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_PRODUCT_STATUSES = list(ProductStatus)
+_ORDER_STATUSES = list(OrderStatus)
+_PAYMENT_STATUSES = list(PaymentStatus)
+_DELIVERY_STATUSES = list(DeliveryStatus)
+_ARCHIVED = _ORDER_STATUSES.index(OrderStatus.ARCHIVED)
+
+
+def _pack_date(value):
+    if value is None:
+        return -1
+    return (value - _EPOCH) // datetime.timedelta(seconds=1)
+
+
+def _unpack_date(value):
+    if value < 0:
+        return None
+    return _EPOCH + datetime.timedelta(seconds=value)
+
+
+class BinaryStorage(SnapshotStorage):
+    """Single-file, struct-packed snapshot: no JSON encoding and no strptime on load."""
+
+    def __init__(self, path="stock.bin", backups=1):
+        self.path = path
+        self.backups = backups
+
+    def _read(self):
+        """Sections of the file, or of its first readable backup when it is damaged; None if there is none."""
+        for path in [self.path] + backup_paths(self.path, self.backups):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                magic, version, n_products, n_orders, n_lines = _HEADER.unpack_from(data, 0)
+                if magic == _MAGIC and version in _PRODUCT_FORMATS:
+                    return self._sections(data, version, n_products, n_orders, n_lines)
+            except (struct.error, ValueError):
+                # Truncated or corrupt body (UnicodeDecodeError is a ValueError)
+                continue
+        return None
+
+    def _sections(self, data, version, n_products, n_orders, n_lines):
+        pos = _HEADER.size
+        product_format = _PRODUCT_FORMATS[version]
+        product_rows = product_format.iter_unpack(data[pos:pos + n_products * product_format.size])
+        if version < 3:
+            padding = (-1,) * (3 - version)
+            product_rows = (row + padding for row in product_rows)
+        pos += n_products * product_format.size
+        blobs = []
+        for _ in range(2):
+            (size,) = _BLOB_LEN.unpack_from(data, pos)
+            pos += _BLOB_LEN.size
+            blobs.append(data[pos:pos + size].decode('utf-8').split("\x00") if n_products else [])
+            pos += size
+        order_rows = _ORDER.iter_unpack(data[pos:pos + n_orders * _ORDER.size])
+        pos += n_orders * _ORDER.size
+        line_rows = _LINE.iter_unpack(data[pos:pos + n_lines * _LINE.size])
+        pos += n_lines * _LINE.size
+        if pos != len(data) or any(len(blob) != n_products for blob in blobs):
+            raise ValueError(f"Snapshot of {len(data)} bytes, its header implies {pos}")
+        return product_rows, blobs[0], blobs[1], order_rows, line_rows
+
+    def _orders(self, order_rows, line_rows, keep):
+        """Yields the orders accepted by keep(code, status_index); lines of skipped orders are consumed."""
+        for code, status, payment, delivery, created, updated, paid, delivered, paid_amount, n_lines in order_rows:
+            lines = [next(line_rows) for _ in range(n_lines)]
+            if not keep(code, status):
+                continue
+            yield Order(
+                code,
+                [OrderLine(*line) for line in lines],
+                _ORDER_STATUSES[status],
+                _PAYMENT_STATUSES[payment],
+                _DELIVERY_STATUSES[delivery],
+                _unpack_date(created),
+                _unpack_date(paid),
+                _unpack_date(delivered),
+                paid_amount,
+                _unpack_date(updated)
+            )
+
+    def load(self, lazy_archive=False):
+        sections = self._read()
+        if sections is None:
+            return [], [], set()
+        product_rows, names, descriptions, order_rows, line_rows = sections
+        products = [
+            Product(code, nom, description, quantite, prix, _PRODUCT_STATUSES[status], None if seuil < 0 else seuil,
+                    _unpack_date(updated))
+            for (code, quantite, prix, status, seuil, updated), nom, description in zip(product_rows, names, descriptions)
+        ]
+        archived = set()
+
+        def keep(code, status):
+            if lazy_archive and status == _ARCHIVED:
+                archived.add(code)
+                return False
+            return True
+
+        orders = list(self._orders(order_rows, line_rows, keep))
+        return products, orders, archived
+
+    def load_archived(self, codes):
+        sections = self._read()
+        if sections is None or not codes:
+            return []
+        _, _, _, order_rows, line_rows = sections
+        return list(self._orders(order_rows, line_rows, lambda code, status: code in codes))
+
+    def save(self, products, orders, archived_codes=()):
+        if archived_codes:
+            orders = itertools.chain(orders, self.load_archived(archived_codes))
+        order_rows, line_rows = [], []
+        for o in orders:
+            order_rows.append(_ORDER.pack(
+                o.code_cmd,
+                _ORDER_STATUSES.index(o.status),
+                _PAYMENT_STATUSES.index(o.payment_status),
+                _DELIVERY_STATUSES.index(o.delivery_status),
+                _pack_date(o.created_at), _pack_date(o.updated_at),
+                _pack_date(o.paid_at), _pack_date(o.delivered_at),
+                o.paid_amount, len(o.lines)
+            ))
+            line_rows.extend(_LINE.pack(l.code_prod, l.quantity, l.price_at_order_time) for l in o.lines)
+
+        names = "\x00".join(p.nom_prod.replace("\x00", "") for p in products).encode('utf-8')
+        descriptions = "\x00".join((p.description or "").replace("\x00", "") for p in products).encode('utf-8')
+        with atomic_file(self.path, self.backups, binary=True) as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(products), len(order_rows), len(line_rows)))
+            f.write(b"".join(
+                _PRODUCT.pack(p.code_prod, p.quantite, p.prix_unit, _PRODUCT_STATUSES.index(p.status),
+                              -1 if p.seuil_alerte is None else p.seuil_alerte, _pack_date(p.updated_at))
+                for p in products
+            ))
+            for blob in (names, descriptions):
+                f.write(_BLOB_LEN.pack(len(blob)))
+                f.write(blob)
+            f.write(b"".join(order_rows))
+            f.write(b"".join(line_rows))
+
+
+def open_storage(path, backups=1):
+    """A .bin file opens a BinaryStorage, anything else a directory of JSON snapshots."""
+    if path.endswith(".bin"):
+        return BinaryStorage(path, backups)
+    return JsonStorage(os.path.join(path, "products.json"), os.path.join(path, "orders.json"), backups)
+
+
+def convert(source, target):
+    """Copies a full snapshot from one backend to another."""
+    products, orders, _ = source.load()
+    target.save(products, orders)
+    return len(products), len(orders)
+
+
+if __name__ == "__main__":
+    # python storage.py <source> <target>, e.g. "python storage.py . stock.bin"
+    if len(sys.argv) != 3:
+        print("Usage: python storage.py <source> <target>  (a .bin file or a directory with products.json/orders.json)")
+        sys.exit(1)
+    n_products, n_orders = convert(open_storage(sys.argv[1]), open_storage(sys.argv[2]))
+    print(f"Converted {n_products} products and {n_orders} orders: {sys.argv[1]} -> {sys.argv[2]}")
@@ -0,0 +1,211 @@
+"""
+Qt models for the product and order tables of the GUI.
+
+The models keep references to StockManager's records and format a cell only
+when a QTableView asks for it, so only the visible rows are rendered.
+Sorting happens in the model; RecordFilterProxyModel only filters on a
+search text. A record edited in place is repainted with refresh()
+(dataChanged) without reloading the table.
+"""
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt6.QtGui import QColor
+from models import OrderStatus, ProductStatus
+
+_DIMMED = QColor(Qt.GlobalColor.gray)
+
+
+class RecordTableModel(QAbstractTableModel):
+    """
+    One record per row; COLUMNS holds (header, display text, sort key) per
+    column. The model sorts itself with list.sort (the proxy would call
+    data() for every comparison) and keeps each record at its sorted row
+    through refresh/append/remove.
+    """
+    COLUMNS = ()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._records = []
+        self._rows = {} # record key -> row
+        self._sort_column = None
+        self._descending = False
+
+    @staticmethod
+    def key(record):
+        raise NotImplementedError
+
+    def is_dimmed(self, record):
+        return False
+
+    def _sort_key(self, record):
+        return self.COLUMNS[self._sort_column][2](record)
+
+    def _reindex_rows(self, start=0, stop=None):
+        for row in range(start, len(self._records) if stop is None else stop):
+            self._rows[self.key(self._records[row])] = row
+
+    def _sort_records(self):
+        if self._sort_column is not None:
+            self._records.sort(key=self._sort_key, reverse=self._descending)
+        self._rows = {}
+        self._reindex_rows()
+
+    def _position(self, record):
+        """Row where `record` belongs in the current order (after equal keys)."""
+        if self._sort_column is None:
+            return len(self._records)
+        key = self._sort_key(record)
+        lo, hi = 0, len(self._records)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self._sort_key(self._records[mid])
+            if (key < other) if not self._descending else (key > other):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def set_records(self, records):
+        """Replaces the whole content (tab switch, bulk changes)."""
+        self.beginResetModel()
+        self._records = list(records)
+        self._sort_records()
+        self.endResetModel()
+
+    def record(self, row):
+        return self._records[row]
+
+    def search_text(self, row):
+        record = self._records[row]
+        return " ".join(str(display(record)) for _, display, _ in self.COLUMNS).casefold()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[index.column()][1](record)
+        if role == Qt.ItemDataRole.ForegroundRole and self.is_dimmed(record):
+            return _DIMMED
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        moved = [(self._records[i.row()], i.column()) for i in persistent]
+        self._sort_column = column
+        self._descending = order == Qt.SortOrder.DescendingOrder
+        self._sort_records()
+        # Selections and current indexes follow their records
+        self.changePersistentIndexList(persistent, [self.index(self._rows[self.key(r)], c) for r, c in moved])
+        self.layoutChanged.emit()
+
+    def refresh(self, record):
+        """Repaints the row of a record changed in place, moving it if its sort key changed."""
+        row = self._rows.get(self.key(record))
+        if row is None:
+            return
+        del self._records[row]
+        target = self._position(record)
+        self._records.insert(row, record)
+        # beginMoveRows takes the destination in pre-move rows
+        destination = target if target <= row else target + 1
+        if destination not in (row, row + 1):
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination)
+            del self._records[row]
+            self._records.insert(target, record)
+            self._reindex_rows(min(row, target), max(row, target) + 1)
+            self.endMoveRows()
+            row = target
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+
+    def append(self, record):
+        """Adds a new record at its sorted row."""
+        row = self._position(record)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._records.insert(row, record)
+        self._reindex_rows(row)
+        self.endInsertRows()
+
+    def remove(self, record):
+        row = self._rows.pop(self.key(record), None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._records[row]
+        self._reindex_rows(row)
+        self.endRemoveRows()
+
+
+class ProductTableModel(RecordTableModel):
+    COLUMNS = (
+        ("Code", lambda p: str(p.code_prod), lambda p: p.code_prod),
+        ("Nom", lambda p: p.nom_prod, lambda p: p.nom_prod.lower()),
+        ("Description", lambda p: p.description, lambda p: (p.description or "").lower()),
+        ("Quantité", lambda p: str(p.quantite), lambda p: p.quantite),
+        ("Prix", lambda p: str(p.prix_unit), lambda p: p.prix_unit),
+    )
+
+    @staticmethod
+    def key(product):
+        return product.code_prod
+
+    def is_dimmed(self, product):
+        return product.status == ProductStatus.ARCHIVED
+
+
+class OrderTableModel(RecordTableModel):
+    COLUMNS = (
+        ("ID", lambda o: str(o.code_cmd), lambda o: o.code_cmd),
+        ("Status", lambda o: o.status.value, lambda o: o.status.value),
+        ("Paiement", lambda o: o.payment_status.value, lambda o: o.payment_status.value),
+        ("Livraison", lambda o: o.delivery_status.value, lambda o: o.delivery_status.value),
+        ("Total", lambda o: f"{o.total_amount:.2f} €", lambda o: o.total_amount),
+        ("Date", lambda o: o.created_at.strftime("%Y-%m-%d %H:%M") if o.created_at else "",
+         lambda o: o.created_at.isoformat() if o.created_at else ""),
+    )
+
+    @staticmethod
+    def key(order):
+        return order.code_cmd
+
+    def is_dimmed(self, order):
+        return order.status in (OrderStatus.ARCHIVED, OrderStatus.CANCELLED)
+
+
+class RecordFilterProxyModel(QSortFilterProxyModel):
+    """
+    Filters the rows on a case-insensitive text over all columns; sorting is
+    forwarded to the source model, so the proxy keeps the source order.
+    """
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self._filter_text = ""
+        self.setSourceModel(source)
+
+    def set_filter_text(self, text):
+        self._filter_text = text.casefold()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        # One Python call per row instead of one data() call per cell
+        return not self._filter_text or self._filter_text in self.sourceModel().search_text(source_row)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+    def record(self, index):
+        """Record shown at a view (proxy) index."""
+        return self.sourceModel().record(self.mapToSource(index).row())
@@ -0,0 +1,157 @@
+"""
+ConnectionPool with stand-in connections: reuse, rollback on release,
+health checks, retry on a dead connection, size limit and close.
+Run from the repository root: python -m pytest -q
+"""
+import threading
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from mysql.connector import Error, OperationalError
+from db_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_rollback = False
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise Error("Lost connection")
+        self.rollbacks += 1
+
+    def is_connected(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+def make_pool(opened, **options):
+    def connect(**config):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+    return ConnectionPool({}, connect=connect, **options)
+
+
+def test_reuses_and_rolls_back_every_release(opened):
+    pool = make_pool(opened)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second and len(opened) == 1
+    # Read-only blocks too: no snapshot left open on an idle connection
+    assert first.rollbacks == 2
+    assert pool.status() == {"size": 4, "open": 1, "idle": 1}
+
+
+def test_discards_connection_that_cannot_roll_back(opened):
+    pool = make_pool(opened)
+    with pool.connection() as conn:
+        conn.fail_rollback = True
+    assert conn.closed
+    assert pool.status()["open"] == 0
+    with pool.connection() as fresh:
+        assert fresh is not conn
+
+
+def test_pings_idle_connection_and_replaces_dead_one(opened):
+    pool = make_pool(opened, check_after=0.0)
+    with pool.connection() as conn:
+        pass
+    conn.alive = False
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert conn.closed and pool.status()["open"] == 1
+
+
+def test_run_retries_once_on_fresh_connection_when_dead(opened):
+    pool = make_pool(opened)
+    used = []
+
+    def operation(conn):
+        used.append(conn)
+        if len(used) == 1:
+            # Dropped by the server before check_after: only shows on use
+            conn.alive = False
+            raise OperationalError("Lost connection to MySQL server during query")
+        return "rows"
+
+    assert pool.run(operation) == "rows"
+    assert used == opened and len(opened) == 2
+    assert opened[0].closed and not opened[1].closed
+    assert pool.status()["open"] == 1
+
+
+def test_run_raises_errors_of_live_or_replacement_connections(opened):
+    pool = make_pool(opened)
+    calls = []
+
+    def lock_timeout(conn):
+        calls.append(conn)
+        raise OperationalError("Lock wait timeout exceeded")
+
+    with pytest.raises(OperationalError):
+        pool.run(lock_timeout)
+    # A live connection: not retried, kept
+    assert len(calls) == 1 and not opened[0].closed
+
+    def server_down(conn):
+        calls.append(conn)
+        conn.alive = False
+        raise OperationalError("Lost connection to MySQL server during query")
+
+    calls.clear()
+    with pytest.raises(OperationalError):
+        pool.run(server_down)
+    assert len(calls) == 2 and calls[0] is not calls[1]
+    assert all(conn.closed for conn in calls) and pool.status()["open"] == 0
+
+
+def test_waits_for_free_connection_then_times_out(opened):
+    pool = make_pool(opened, size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(Error):
+            with pool.connection():
+                pass
+
+    acquired, released = threading.Event(), threading.Event()
+
+    def hold():
+        with pool.connection():
+            acquired.set()
+            released.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    acquired.wait()
+    pool.timeout = 5.0
+    threading.Timer(0.05, released.set).start()
+    with pool.connection():
+        pass
+    holder.join()
+    assert len(opened) == 1
+
+
+def test_close_closes_idle_then_released_connections(opened):
+    pool = make_pool(opened)
+    with pool.connection() as busy:
+        with pool.connection() as idle:
+            pass
+        pool.close()
+        assert idle.closed and not busy.closed
+    assert busy.closed
+    with pytest.raises(Error):
+        with pool.connection():
+            pass
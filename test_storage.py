@@ -0,0 +1,308 @@
+"""
+Round-trip and crash tests for the on-disk formats of storage.py.
+Run from the repository root: python -m pytest -q
+"""
+import datetime
+import json
+import os
+import pytest
+import storage
+from models import Product, Order, OrderLine, OrderStatus, PaymentStatus, DeliveryStatus, ProductStatus
+from storage import (Journal, BinaryStorage, JsonStorage, atomic_file, iter_json_array, read_snapshot,
+                     write_snapshot, backup_paths)
+
+T0 = datetime.datetime(2024, 3, 1, 9, 30, 15)
+
+
+def make_products():
+    return [
+        Product(1, "Stylo", "bleu", 120, 1.5, updated_at=T0),
+        Product(2, "Cahier", "", 0, 3.25, ProductStatus.ARCHIVED, seuil_alerte=5),
+        Product(3, "Gomme été", "blanche", 7, 0.8, seuil_alerte=0, updated_at=T0),
+    ]
+
+
+def make_orders():
+    return [
+        Order(1, [OrderLine(1, 2, 1.5), OrderLine(3, 1, 0.8)], created_at=T0, updated_at=T0),
+        Order(2, [OrderLine(2, 4, 3.25)], OrderStatus.CONFIRMED, PaymentStatus.PAID, DeliveryStatus.DELIVERED,
+              created_at=T0, paid_at=T0, delivered_at=T0, paid_amount=13.0, updated_at=T0),
+        Order(3, [OrderLine(1, 1, 1.5)], OrderStatus.ARCHIVED, created_at=T0, updated_at=T0),
+        Order(4, [], OrderStatus.CANCELLED, created_at=T0, updated_at=T0),
+    ]
+
+
+def dicts(records):
+    return [r.to_dict() for r in records]
+
+
+# --- Journal ---
+
+def test_journal_replays_in_write_order(tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    products, orders = make_products(), make_orders()
+    journal.append(products[:2], orders[:1])
+    journal.append(orders=orders[1:])
+    journal.append()
+    journal.close()
+
+    replayed = Journal(journal.path)
+    assert list(replayed.replay()) == [(dicts(products[:2]), dicts(orders[:1])), ([], dicts(orders[1:]))]
+    assert replayed.count == 2 + len(orders)
+
+
+def test_journal_cuts_torn_tail(tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    journal.append(make_products())
+    journal.close()
+    intact_size = os.path.getsize(journal.path)
+    # A stock deduction and its paid order are one line: torn, neither is replayed
+    with open(journal.path, 'ab') as f:
+        f.write(json.dumps({"products": dicts(make_products()[:1]), "orders": dicts(make_orders()[1:2])})
+                .encode()[:-20])
+
+    replayed = Journal(journal.path)
+    assert [(len(p), len(o)) for p, o in replayed.replay()] == [(3, 0)]
+    assert replayed.count == 3
+    assert os.path.getsize(journal.path) == intact_size
+
+    # Appends after the cut stay readable
+    replayed.append(orders=make_orders()[:1])
+    replayed.close()
+    assert [(len(p), len(o)) for p, o in Journal(journal.path).replay()] == [(3, 0), (0, 1)]
+
+
+def test_journal_stops_at_corrupt_record(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    good = json.dumps({"products": dicts(make_products()[:1]), "orders": []}) + "\n"
+    path.write_text(good + "not json\n" + good, encoding='utf-8')
+
+    assert len(list(Journal(str(path)).replay())) == 1
+    assert path.read_text(encoding='utf-8') == good
+
+
+def test_journal_reads_one_record_per_line(tmp_path):
+    # Journals written before records were grouped by flush
+    path = tmp_path / "journal.jsonl"
+    product, order = make_products()[0].to_dict(), make_orders()[0].to_dict()
+    path.write_text(json.dumps({"product": product}) + "\n" + json.dumps({"order": order}) + "\n", encoding='utf-8')
+
+    assert list(Journal(str(path)).replay()) == [([product], []), ([], [order])]
+
+
+def test_journal_missing_file(tmp_path):
+    assert list(Journal(str(tmp_path / "none.jsonl")).replay()) == []
+
+
+# --- iter_json_array ---
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+def test_iter_json_array_across_chunks(tmp_path, chunk_size):
+    path = str(tmp_path / "orders.json")
+    records = dicts(make_orders()) * 5
+    write_snapshot(path, records)
+    assert list(iter_json_array(path, chunk_size)) == records
+
+
+@pytest.mark.parametrize("text", ["[]", "[ ]\n", "  [\n]"])
+def test_iter_json_array_empty(tmp_path, text):
+    path = tmp_path / "empty.json"
+    path.write_text(text, encoding='utf-8')
+    assert list(iter_json_array(str(path), 4)) == []
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1}, {"a": 2', '[{"a": 1},', '{"a": 1}', ''])
+def test_iter_json_array_rejects_incomplete(tmp_path, text):
+    path = tmp_path / "broken.json"
+    path.write_text(text, encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(str(path), 4))
+
+
+# --- atomic_file and backups ---
+
+def test_atomic_file_keeps_original_on_error(tmp_path):
+    path = str(tmp_path / "ids.json")
+    with atomic_file(path) as f:
+        f.write("old")
+    with pytest.raises(RuntimeError):
+        with atomic_file(path, backups=1) as f:
+            f.write("half")
+            raise RuntimeError("crash")
+    assert open(path, encoding='utf-8').read() == "old"
+    assert not os.path.exists(path + ".tmp")
+    assert not os.path.exists(path + ".bak.1")
+
+
+def test_atomic_file_rotates_backups(tmp_path):
+    path = str(tmp_path / "products.json")
+    for version in range(4):
+        with atomic_file(path, backups=2) as f:
+            f.write(str(version))
+    assert [open(p, encoding='utf-8').read() for p in [path] + backup_paths(path, 2)] == ["3", "2", "1"]
+    assert not os.path.exists(path + ".bak.3")
+
+
+def test_read_snapshot_falls_back_to_backup(tmp_path):
+    path = str(tmp_path / "products.json")
+    write_snapshot(path, [{"v": 1}], backups=1)
+    write_snapshot(path, [{"v": 2}], backups=1)
+    assert read_snapshot(path, 1) == [{"v": 2}]
+
+    with open(path, 'r+b') as f:
+        f.truncate(5)
+    assert read_snapshot(path, 1) == [{"v": 1}]
+    os.remove(path)
+    assert read_snapshot(path, 1) == [{"v": 1}]
+    assert read_snapshot(path, 0) is None
+
+
+def test_json_storage_round_trip_and_backup(tmp_path):
+    backend = JsonStorage(str(tmp_path / "products.json"), str(tmp_path / "orders.json"))
+    products, orders = make_products(), make_orders()
+    backend.save(products[:1], orders[:1])
+    backend.save(products, orders)
+
+    loaded_products, loaded_orders, archived = backend.load()
+    assert dicts(loaded_products) == dicts(products)
+    assert dicts(loaded_orders) == dicts(orders)
+    assert archived == set()
+
+    # A snapshot cut mid-write loads the previous one
+    with open(backend.orders_file, 'r+b') as f:
+        f.truncate(os.path.getsize(backend.orders_file) // 2)
+    _, loaded_orders, _ = JsonStorage(backend.products_file, backend.orders_file).load()
+    assert dicts(loaded_orders) == dicts(orders[:1])
+
+
+def test_json_storage_tolerates_bad_product_stamp(tmp_path):
+    backend = JsonStorage(str(tmp_path / "products.json"), str(tmp_path / "orders.json"))
+    records = dicts(make_products())
+    records[0]["updated_at"] = "2024-03-01T09:30:15.123Z"
+    write_snapshot(backend.products_file, records)
+
+    products, _, _ = backend.load()
+    assert [p.code_prod for p in products] == [1, 2, 3]
+    assert products[0].updated_at is None and products[2].updated_at == T0
+
+
+def test_json_storage_lazy_archive_survives_save(tmp_path):
+    backend = JsonStorage(str(tmp_path / "products.json"), str(tmp_path / "orders.json"))
+    products, orders = make_products(), make_orders()
+    backend.save(products, orders)
+
+    _, active, archived = backend.load(lazy_archive=True)
+    assert archived == {3}
+    backend.save(products, active, archived)
+    assert sorted(d["code_cmd"] for d in dicts(backend.load()[1])) == [1, 2, 3, 4]
+
+
+# --- BinaryStorage ---
+
+def test_binary_round_trip(tmp_path):
+    backend = BinaryStorage(str(tmp_path / "stock.bin"))
+    products, orders = make_products(), make_orders()
+    backend.save(products, orders)
+
+    loaded_products, loaded_orders, archived = BinaryStorage(backend.path).load()
+    assert dicts(loaded_products) == dicts(products)
+    assert dicts(loaded_orders) == dicts(orders)
+    assert archived == set()
+
+
+def test_binary_lazy_archive_survives_save(tmp_path):
+    backend = BinaryStorage(str(tmp_path / "stock.bin"))
+    products, orders = make_products(), make_orders()
+    backend.save(products, orders)
+
+    _, active, archived = backend.load(lazy_archive=True)
+    assert archived == {3}
+    assert dicts(backend.load_archived(archived)) == dicts(orders[2:3])
+    backend.save(products, active, archived)
+    assert sorted(o.code_cmd for o in backend.load()[1]) == [1, 2, 3, 4]
+
+
+def test_binary_falls_back_to_backup(tmp_path):
+    backend = BinaryStorage(str(tmp_path / "stock.bin"), backups=1)
+    products = make_products()
+    backend.save(products[:1], [])
+    backend.save(products, make_orders())
+
+    with open(backend.path, 'r+b') as f:
+        f.truncate(3)
+    loaded_products, loaded_orders, _ = backend.load()
+    assert dicts(loaded_products) == dicts(products[:1])
+    assert loaded_orders == []
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:-5],
+    lambda data: data[:storage._HEADER.size + 10],
+    lambda data: data + b"\x00",
+    lambda data: data.replace(b"Stylo", b"\xffStyl"),
+])
+def test_binary_falls_back_on_damaged_body(tmp_path, damage):
+    backend = BinaryStorage(str(tmp_path / "stock.bin"), backups=1)
+    products, orders = make_products(), make_orders()
+    backend.save(products, orders[:1])
+    backend.save(products, orders)
+
+    with open(backend.path, 'rb') as f:
+        data = f.read()
+    with open(backend.path, 'wb') as f:
+        f.write(damage(data))
+    loaded_products, loaded_orders, _ = backend.load()
+    assert dicts(loaded_products) == dicts(products)
+    assert dicts(loaded_orders) == dicts(orders[:1])
+
+
+def write_legacy_binary(path, version, products, orders):
+    """Writes products/orders in an older BinaryStorage version, fields it lacked left out."""
+    product_format = storage._PRODUCT_FORMATS[version]
+    order_rows, line_rows = [], []
+    for o in orders:
+        order_rows.append(storage._ORDER.pack(
+            o.code_cmd, storage._ORDER_STATUSES.index(o.status), storage._PAYMENT_STATUSES.index(o.payment_status),
+            storage._DELIVERY_STATUSES.index(o.delivery_status), storage._pack_date(o.created_at),
+            storage._pack_date(o.updated_at), storage._pack_date(o.paid_at), storage._pack_date(o.delivered_at),
+            o.paid_amount, len(o.lines)))
+        line_rows += [storage._LINE.pack(l.code_prod, l.quantity, l.price_at_order_time) for l in o.lines]
+    with open(path, 'wb') as f:
+        f.write(storage._HEADER.pack(storage._MAGIC, version, len(products), len(order_rows), len(line_rows)))
+        for p in products:
+            fields = [p.code_prod, p.quantite, p.prix_unit, storage._PRODUCT_STATUSES.index(p.status),
+                      -1 if p.seuil_alerte is None else p.seuil_alerte, storage._pack_date(p.updated_at)]
+            f.write(product_format.pack(*fields[:len(product_format.format) - 1]))
+        for blob in ("\x00".join(p.nom_prod for p in products), "\x00".join(p.description or "" for p in products)):
+            data = blob.encode('utf-8')
+            f.write(storage._BLOB_LEN.pack(len(data)) + data)
+        f.write(b"".join(order_rows) + b"".join(line_rows))
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_binary_reads_older_versions(tmp_path, version):
+    path = str(tmp_path / "stock.bin")
+    products, orders = make_products(), make_orders()
+    write_legacy_binary(path, version, products, orders)
+
+    backend = BinaryStorage(path)
+    loaded_products, loaded_orders, _ = backend.load()
+    expected = dicts(products)
+    for d in expected:
+        d["updated_at"] = None
+        if version < 2:
+            d["seuil_alerte"] = None
+    assert dicts(loaded_products) == expected
+    assert dicts(loaded_orders) == dicts(orders)
+
+    # Saving upgrades the file to the current version
+    backend.save(loaded_products, loaded_orders)
+    with open(path, 'rb') as f:
+        assert storage._HEADER.unpack(f.read(storage._HEADER.size))[1] == storage._VERSION
+    assert dicts(backend.load()[0]) == expected
+
+
+def test_binary_rejects_unknown_version(tmp_path):
+    path = tmp_path / "stock.bin"
+    path.write_bytes(storage._HEADER.pack(storage._MAGIC, storage._VERSION + 1, 0, 0, 0))
+    assert BinaryStorage(str(path)).load() == ([], [], set())